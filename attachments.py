@@ -0,0 +1,220 @@
+import asyncio
+import codecs
+import io
+import mimetypes
+import mmap
+import tempfile
+
+# How a FileArgument's contents are handed to execute
+BYTES = "bytes" # the whole file in memory, as bytes
+SPOOLED = "spooled" # a SpooledTemporaryFile, kept in memory until it grows past SPOOL_SIZE and then moved to disk
+MMAP = "mmap" # a read-only memory map of a temporary file on disk, for large files read in pieces
+
+SPOOL_SIZE = 1024 * 1024 # The most bytes a SPOOLED file keeps in memory
+HEADER_SIZE = 32 # How many bytes from the start of a file are used to detect its type
+
+# Magic bytes identifying file types, as (type, ((offset, bytes), ...)). Every part must match
+SIGNATURES = (
+    ("png", ((0, b"\x89PNG\r\n\x1a\n"),)),
+    ("jpg", ((0, b"\xff\xd8\xff"),)),
+    ("gif", ((0, b"GIF87a"),)),
+    ("gif", ((0, b"GIF89a"),)),
+    ("webp", ((0, b"RIFF"), (8, b"WEBP"))),
+    ("wav", ((0, b"RIFF"), (8, b"WAVE"))),
+    ("bmp", ((0, b"BM"),)),
+    ("pdf", ((0, b"%PDF-"),)),
+    ("zip", ((0, b"PK\x03\x04"),)),
+    ("gz", ((0, b"\x1f\x8b"),)),
+    ("mp3", ((0, b"ID3"),)),
+    ("ogg", ((0, b"OggS"),)),
+    ("flac", ((0, b"fLaC"),)),
+    ("mp4", ((4, b"ftyp"),)),
+    ("webm", ((0, b"\x1a\x45\xdf\xa3"),)),
+)
+
+ALIASES = {"jpeg": "jpg", "jpe": "jpg", "m4a": "mp4", "m4v": "mp4", "mov": "mp4", "mkv": "webm", "tgz": "gz"}
+
+# Types stored inside another type's container, which is what their magic bytes show
+CONTAINERS = {"docx": "zip", "xlsx": "zip", "pptx": "zip", "odt": "zip", "ods": "zip", "epub": "zip", "jar": "zip", "apk": "zip"}
+
+# Types with no magic bytes, which are only accepted if they look like text: UTF-8 with no NUL bytes.
+# Magic bytes aren't used to reject them, since short signatures such as bmp's "BM" start plenty of ordinary text
+TEXT_TYPES = {"txt", "csv", "tsv", "json", "md", "log", "xml", "html", "yaml", "yml", "toml", "ini", "py", "js", "css"}
+
+
+def normalise(fileType: str) -> str:
+    fileType = fileType.lower()
+    return ALIASES.get(fileType, fileType)
+
+
+def hasExtension(filename: str, fileType: str) -> bool:
+    """
+    Returns whether a filename's extension is the requested file type, or one of its aliases
+    """
+    return normalise(filename.split(".")[-1]) == normalise(fileType)
+
+
+def detectType(header: bytes) -> str:
+    """
+    Identify a file from its first bytes
+    Parameters:
+        header - at least the first HEADER_SIZE bytes of the file, or all of it if it is shorter
+    Returns:
+        The file type, i.e. "png", or None if it isn't recognised
+    """
+    for fileType, parts in SIGNATURES:
+        if all(header[offset:offset + len(magic)] == magic for offset, magic in parts):
+            return fileType
+    return None
+
+
+def looksLikeText(header: bytes) -> bool:
+    """
+    Returns whether the start of a file could be UTF-8 text. A character cut off by the end of the header is allowed
+    """
+    if b"\x00" in header:
+        return False
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(header, final=False)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def matchesType(fileType: str, header: bytes) -> bool:
+    """
+    Returns whether a file's contents are of the requested type.
+
+    Types with known magic bytes must have them. Text types must look like text.
+    Any other type can't be checked, so is accepted
+    """
+    fileType = normalise(fileType)
+    if fileType in TEXT_TYPES:
+        return looksLikeText(header)
+
+    detected = detectType(header)
+    expected = CONTAINERS.get(fileType, fileType)
+    if any(signatureType == expected for signatureType, parts in SIGNATURES):
+        return detected == expected
+
+    return True
+
+
+
+class AttachedFile:
+    def __init__(self, attachment, delivery: str, content, header: bytes) -> None:
+        """
+        An attachment that has already been downloaded, in the form its FileArgument asked for.
+        Anything else discord.Attachment has, such as url, id or content_type, is passed through to the original attachment
+        Parameters:
+            attachment - the discord attachment it came from
+
+            delivery - BYTES, SPOOLED or MMAP
+
+            content - the file as bytes, a SpooledTemporaryFile or an mmap, according to delivery. An empty MMAP file is b""
+
+            header - the first bytes of the file
+        """
+        self.attachment = attachment
+        self.filename = attachment.filename
+        self.size = attachment.size
+        self.delivery = delivery
+        self.content = content
+        self.header = header
+        self.fileType = detectType(header)
+        self.contentType = None
+        if self.fileType != None:
+            self.contentType = mimetypes.guess_type(f"file.{self.fileType}")[0]
+        if self.contentType == None:
+            self.contentType = getattr(attachment, "content_type", None)
+
+
+    async def read(self) -> bytes:
+        """
+        Returns the whole file as bytes, like discord.Attachment.read()
+        """
+        if self.delivery == SPOOLED:
+            self.content.seek(0)
+            return self.content.read()
+        return bytes(self.content)
+
+
+    async def save(self, fp, seek_begin: bool = True) -> int:
+        """
+        Write the file to a path or file object, like discord.Attachment.save(), without downloading it again
+        Returns:
+            The number of bytes written
+        """
+        data = await self.read()
+        if isinstance(fp, io.BufferedIOBase):
+            written = fp.write(data)
+            if seek_begin:
+                fp.seek(0)
+            return written
+
+        with open(fp, "wb") as f:
+            return f.write(data)
+
+
+    def __getattr__(self, name: str):
+        if name == "attachment": # Not set yet, i.e. while unpickling
+            raise AttributeError(name)
+        return getattr(self.attachment, name)
+
+
+    def close(self) -> None:
+        if not isinstance(self.content, bytes):
+            self.content.close()
+
+
+
+async def fetch(attachment, delivery: str = BYTES) -> AttachedFile:
+    """
+    Download an attachment
+    Parameters:
+        attachment - the discord attachment to download
+
+        delivery - the form to deliver it in, BYTES, SPOOLED or MMAP
+    """
+    if delivery == BYTES:
+        content = await attachment.read()
+        return AttachedFile(attachment, delivery, content, content[:HEADER_SIZE])
+
+    if delivery == SPOOLED:
+        # discord.Attachment.save only writes into an io.BufferedIOBase, which a SpooledTemporaryFile isn't, so it is filled by hand
+        data = await attachment.read()
+        content = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        content.write(data)
+        content.seek(0)
+        return AttachedFile(attachment, delivery, content, data[:HEADER_SIZE])
+
+    with tempfile.TemporaryFile() as f:
+        written = await attachment.save(f)
+        f.flush()
+        if written == 0:
+            return AttachedFile(attachment, delivery, b"", b"")
+        content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return AttachedFile(attachment, delivery, content, content[:HEADER_SIZE])
+
+
+async def fetchAll(attachments: list, deliveries: list[str]) -> list[AttachedFile]:
+    """
+    Download several attachments at once
+    Parameters:
+        attachments - the discord attachments to download
+
+        deliveries - the form to deliver each in
+    Returns:
+        The downloaded files, in the same order. If any download fails the others are closed and the error is raised
+    """
+    results = await asyncio.gather(*[fetch(attachment, delivery) for attachment, delivery in zip(attachments, deliveries)], return_exceptions=True)
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if len(errors) > 0:
+        closeAll(result for result in results if isinstance(result, AttachedFile))
+        raise errors[0]
+    return results
+
+
+def closeAll(files) -> None:
+    for attachedFile in files:
+        attachedFile.close()
@@ -0,0 +1,148 @@
+import cobble.executor
+import asyncio
+import inspect
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TaskQueue:
+    def __init__(self, executor: cobble.executor.CommandExecutor = None, concurrency: int = 4, maxSize: int = 1000, retries: int = 0, backoff: float = 0.5, maxBackoff: float = 30.0) -> None:
+        """
+        Runs follow-up work, such as postCommand hooks, in the background so it never holds up responding to users.
+
+        Tasks are queued and run by a fixed number of workers. Coroutine functions run on the event loop, and regular
+        functions run in the executor's thread pool. A task that raises can be retried, waiting longer after each failure.
+
+        Parameters:
+            executor - provides the thread pool regular functions run in. Defaults to a new CommandExecutor
+
+            concurrency - the most tasks run at once
+
+            maxSize - the most tasks that may wait to run. Tasks submitted while the queue is full are dropped
+
+            retries - how many times a failed task is tried again, unless submitted with its own
+
+            backoff - how long to wait before the first retry, in seconds. Each further retry waits twice as long as the last
+
+            maxBackoff - the longest wait between retries, in seconds
+        """
+        if executor == None:
+            executor = cobble.executor.CommandExecutor()
+        self.executor = executor
+        self.concurrency = concurrency
+        self.maxSize = maxSize
+        self.retries = retries
+        self.backoff = backoff
+        self.maxBackoff = maxBackoff
+        self.queue = None
+        self.workers = []
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+
+
+    def startWorkers(self) -> None:
+        """
+        Create the queue and start the workers, if they aren't running already. Must be called from the event loop
+        """
+        if len(self.workers) > 0:
+            return
+
+        self.queue = asyncio.Queue(self.maxSize)
+        self.workers = [asyncio.create_task(self.work()) for i in range(self.concurrency)]
+
+
+    def submit(self, function, name: str = None, retries: int = None) -> bool:
+        """
+        Queue a task to run in the background. Returns immediately
+        Parameters:
+            function - a function or coroutine function taking no arguments
+
+            name - what to call the task in logs
+
+            retries - how many times to try again if it fails, defaults to the queue's retries
+        Returns:
+            Whether the task was queued, rather than dropped because the queue was full
+        """
+        self.startWorkers()
+        if self.queue.full():
+            self.dropped += 1
+            logger.warning("Background queue is full, dropping %s", name or function)
+            return False
+
+        self.queue.put_nowait((function, name, self.retries if retries == None else retries))
+        return True
+
+
+    async def work(self) -> None:
+        while True:
+            function, name, retries = await self.queue.get()
+            try:
+                await self.runTask(function, name, retries)
+            finally:
+                self.queue.task_done()
+
+
+    async def runTask(self, function, name: str, retries: int) -> None:
+        """
+        Run a task, retrying it with exponential backoff if it fails. The worker waits out the backoff itself,
+        so a task being retried holds on to one of the concurrency slots
+        """
+        attempt = 0
+        while True:
+            try:
+                await self.call(function)
+                self.completed += 1
+                return
+            except Exception:
+                if attempt >= retries:
+                    self.failed += 1
+                    logger.exception("Background task %s failed", name or function)
+                    return
+
+                delay = min(self.backoff * 2 ** attempt, self.maxBackoff)
+                attempt += 1
+                self.retried += 1
+                logger.warning("Background task %s failed, retrying in %.1f seconds", name or function, delay, exc_info=True)
+                await asyncio.sleep(delay)
+
+
+    async def call(self, function):
+        if inspect.iscoroutinefunction(function):
+            return await function()
+
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self.executor.getThreadPool(), function)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+
+    async def join(self) -> None:
+        """
+        Wait until every queued task has finished
+        """
+        if self.queue != None:
+            await self.queue.join()
+
+
+    async def drain(self, timeout: float = None) -> None:
+        """
+        Finish the queued tasks and stop the workers. Should be called before shutting down
+        Parameters:
+            timeout - the longest to wait for queued tasks, in seconds, or None to wait for all of them.
+                      Tasks still queued after the timeout are discarded
+        """
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Gave up waiting for %s background tasks", self.queue.qsize())
+
+        for worker in self.workers:
+            worker.cancel()
+
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        self.queue = None
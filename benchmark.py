@@ -0,0 +1,463 @@
+import cobble.bot
+import cobble.command
+import cobble.metrics
+import cobble.tokenizer
+import cobble.validations
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+def legacySplit(fullString: str) -> list[str]:
+    """
+    The character-by-character splitter processCommand used before cobble.tokenizer, kept as a reference
+    Parameters:
+        fullString - the string to split
+    """
+    inQuotes = False
+
+    commandElements = []
+    element = ""
+    for character in fullString:
+        match character:
+            case '"' | '“' | '”':
+                inQuotes = not inQuotes
+
+            case " ":
+                if not inQuotes:
+                    if not element == "":
+                        commandElements.append(element)
+                    element = ""
+                else:
+                    element += character
+
+            case _:
+                element += character
+
+    if not element == "":
+        commandElements.append(element)
+
+    return commandElements
+
+
+def randomCommandString(length: int, rng: random.Random) -> str:
+    """
+    Generate a command-like string of words, spaces and assorted quotation marks
+    Parameters:
+        length - the length of the string
+
+        rng - the random number generator to draw from
+    """
+    alphabet = "abcdefghij=_-.,0123456789"
+    characters = []
+    for i in range(length):
+        roll = rng.random()
+        if roll < 0.15:
+            characters.append(" ")
+        elif roll < 0.18:
+            characters.append(rng.choice('"“”'))
+        else:
+            characters.append(rng.choice(alphabet))
+
+    return "".join(characters)
+
+
+def checkTokenizerEquivalence(samples: int = 10000, seed: int = 0) -> int:
+    """
+    Compare cobble.tokenizer against the legacy splitter on random inputs, and check every token's offsets
+    Parameters:
+        samples - the number of random strings to compare
+
+        seed - the random seed
+    Returns:
+        mismatches - the number of inputs on which the two disagreed
+    """
+    rng = random.Random(seed)
+    mismatches = 0
+    for i in range(samples):
+        fullString = randomCommandString(rng.randint(0, 64), rng)
+        expected = legacySplit(fullString)
+        tokens = cobble.tokenizer.tokenize(fullString)
+        if [token.text for token in tokens] != expected or cobble.tokenizer.split(fullString) != expected:
+            mismatches += 1
+            continue
+
+        for token in tokens:
+            raw = fullString[token.start:token.end]
+            if legacySplit(raw) != [token.text]:
+                mismatches += 1
+                break
+
+    return mismatches
+
+
+def timeCall(function, argument, repeats: int) -> float:
+    """
+    Returns the mean time taken by function(argument) over a number of calls, in seconds
+    """
+    start = time.perf_counter()
+    for i in range(repeats):
+        function(argument)
+    return (time.perf_counter() - start) / repeats
+
+
+def benchmarkTokenizer(length: int = 2048, repeats: int = 2000, seed: int = 0) -> dict[str, float]:
+    """
+    Time the tokenizer against the legacy splitter on inputs of a given length, with and without quotation marks
+    Parameters:
+        length - the length of each input, in characters
+
+        repeats - how many times each input is split
+
+        seed - the random seed
+    Returns:
+        results - mean seconds per call, keyed by "<input>/<implementation>"
+    """
+    rng = random.Random(seed)
+    inputs = {
+        "quoted": randomCommandString(length, rng),
+        "unquoted": randomCommandString(length, rng).replace('"', "").replace("“", "").replace("”", "")
+    }
+
+    results = {}
+    for inputName, fullString in inputs.items():
+        results[f"{inputName}/legacy"] = timeCall(legacySplit, fullString, repeats)
+        results[f"{inputName}/split"] = timeCall(cobble.tokenizer.split, fullString, repeats)
+        results[f"{inputName}/tokenize"] = timeCall(cobble.tokenizer.tokenize, fullString, repeats)
+
+    return results
+
+
+class SyntheticAuthor:
+    def __init__(self, id: int) -> None:
+        self.id = id
+
+
+
+class SyntheticAttachment:
+    def __init__(self, filename: str, data: bytes) -> None:
+        """
+        Stands in for a discord attachment, held in memory so downloading it costs nothing but the copy
+        Parameters:
+            filename - the name of the file
+
+            data - the contents of the file
+        """
+        self.filename = filename
+        self.data = data
+        self.size = len(data)
+
+    async def read(self) -> bytes:
+        return self.data
+
+    async def save(self, fp, seek_begin: bool = True) -> int:
+        # Like discord.Attachment.save, anything but a buffered binary file is taken to be a path
+        if isinstance(fp, io.BufferedIOBase):
+            written = fp.write(self.data)
+            if seek_begin:
+                fp.seek(0)
+            return written
+
+        with open(fp, "wb") as f:
+            return f.write(self.data)
+
+
+
+class SyntheticMessage:
+    def __init__(self, authorID: int, content: str, attachments: list = None) -> None:
+        """
+        Stands in for a discord message, with just the attributes processCommand uses
+        Parameters:
+            authorID - the ID of the user who sent the message
+
+            content - the text of the message
+
+            attachments - the files attached to the message
+        """
+        self.author = SyntheticAuthor(authorID)
+        self.content = content
+        self.attachments = attachments or []
+
+
+
+class BenchmarkCommand(cobble.command.Command):
+    def __init__(self, bot: "cobble.bot.Bot", index: int, aliases: int, arguments: int, permission: str) -> None:
+        """
+        A command with a configurable number of aliases and arguments, that echoes its arguments back
+        """
+        triggers = [f"command{index}"] + [f"command{index}alias{alias}" for alias in range(aliases)]
+        super().__init__(bot, f"Command {index}", triggers, f"Benchmark command {index}", permission)
+        for argument in range(arguments):
+            if argument == 0:
+                self.addArgument(cobble.command.Argument("target", "Who or what to target", cobble.validations.IsString()))
+            else:
+                self.addArgument(cobble.command.Argument(f"option{argument}", "A numerical option", cobble.validations.IsInteger(), True))
+
+    async def execute(self, messageObject, argumentValues: dict, attachedFiles: dict) -> str:
+        return f"{self.name}: " + ", ".join(f"{key}={value}" for key, value in argumentValues.items())
+
+
+
+class BenchmarkFileCommand(cobble.command.Command):
+    def __init__(self, bot: "cobble.bot.Bot", index: int) -> None:
+        """
+        A command taking a CSV file, that counts its lines
+        """
+        super().__init__(bot, f"Upload {index}", f"upload{index}", f"Benchmark file command {index}")
+        self.addFileArgument(cobble.command.FileArgument("data", "A CSV file to count", "csv", maxSize=1024*1024))
+
+    async def execute(self, messageObject, argumentValues: dict, attachedFiles: dict) -> str:
+        data = await attachedFiles["data"].read()
+        lines = data.count(b"\n")
+        return f"{self.name}: {lines} lines"
+
+
+
+class StageRecorder(cobble.metrics.Observer):
+    def __init__(self) -> None:
+        """
+        An observer keeping every timing it receives, so exact percentiles can be taken
+        """
+        super().__init__()
+        self.stages = {}
+        self.totals = []
+        self.outcomes = {}
+
+    def stage(self, command: str, stage: str, seconds: float) -> None:
+        self.stages.setdefault(stage, []).append(seconds)
+
+    def outcome(self, command: str, outcome: str, seconds: float) -> None:
+        self.totals.append(seconds)
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+
+
+def percentile(samples: list[float], q: float) -> float:
+    """
+    Returns the nearest-rank percentile of a list of samples
+    Parameters:
+        samples - the samples
+
+        q - the percentile, between 0 and 1
+    """
+    if len(samples) == 0:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered)-1, max(0, int(q * len(ordered) + 0.5) - 1))]
+
+
+def buildBot(directory: str, commands: int = 50, aliases: int = 2, arguments: int = 3, users: int = 1000, seed: int = 0, fileCommands: int = 2) -> "cobble.bot.Bot":
+    """
+    Build a bot filled with synthetic commands and a synthetic permissions file
+    Parameters:
+        directory - where to write the bot's config and permissions files
+
+        commands - the number of commands
+
+        aliases - the number of aliases per command, on top of its main trigger
+
+        arguments - the number of arguments per command. The first is positional, the rest are keyword arguments
+
+        users - the number of users in the permissions file
+
+        seed - the random seed
+
+        fileCommands - the number of commands taking a file, whose messages carry an attachment
+    """
+    rng = random.Random(seed)
+    permissionNames = [f"permission{index}" for index in range(10)]
+    perms = {
+        "permissions": {name: {"name": name, "description": f"Benchmark {name}"} for name in ["admin"] + permissionNames},
+        "users": {str(user): rng.sample(permissionNames, rng.randint(0, 4)) for user in range(users)}
+    }
+
+    configPath = os.path.join(directory, "config.json")
+    permissionsPath = os.path.join(directory, "permissions.json")
+    with open(configPath, "w") as f:
+        json.dump({"token": "benchmark"}, f)
+    with open(permissionsPath, "w") as f:
+        json.dump(perms, f)
+
+    bot = cobble.bot.Bot(configPath, permissionsPath, "Benchmark", ".")
+    bot.addCommand(cobble.command.HelpCommand(bot))
+    bot.addCommand(cobble.command.ListCommand(bot))
+    for index in range(commands):
+        permission = "default" if index % 4 != 0 else rng.choice(permissionNames)
+        bot.addCommand(BenchmarkCommand(bot, index, aliases, arguments, permission))
+    for index in range(fileCommands):
+        bot.addCommand(BenchmarkFileCommand(bot, index))
+
+    return bot
+
+
+def buildMessages(bot: "cobble.bot.Bot", count: int, users: int, invalidFraction: float = 0.1, seed: int = 0) -> list[SyntheticMessage]:
+    """
+    Generate synthetic command messages for a bot built by buildBot
+    Parameters:
+        bot - the bot the messages are for
+
+        count - the number of messages
+
+        users - the number of distinct users sending them
+
+        invalidFraction - the share of messages that are mistyped or malformed
+
+        seed - the random seed
+    """
+    rng = random.Random(seed)
+    triggers = list(bot.triggers.keys())
+    messages = []
+    for i in range(count):
+        trigger = rng.choice(triggers)
+        command = bot.triggers[trigger]
+        parts = [trigger]
+        if rng.random() < invalidFraction:
+            parts = [rng.choice([trigger + "x", trigger])] + ["unexpected=value=pair"]
+        elif command.plan.mandatoryCount > 0:
+            parts.append(f'"target {rng.randint(0, 999)}"')
+            for argument in command.plan.keywordOrder:
+                parts.append(f"{argument.name}={rng.randint(0, 999)}")
+
+        attachments = []
+        for fileType in command.plan.fileTypes:
+            rows = "".join(f"{row},{rng.randint(0, 999)}\n" for row in range(rng.randint(1, 200)))
+            attachments.append(SyntheticAttachment(f"data{i}.{fileType}", f"row,value\n{rows}".encode()))
+
+        messages.append(SyntheticMessage(rng.randrange(users), bot.prefix + " ".join(parts), attachments))
+
+    return messages
+
+
+async def runLoad(bot: "cobble.bot.Bot", messages: list[SyntheticMessage], concurrency: int) -> float:
+    """
+    Feed messages through processCommand with a fixed number of concurrent workers
+    Parameters:
+        bot - the bot to process the messages with
+
+        messages - the messages to process
+
+        concurrency - the number of messages processed at once
+    Returns:
+        elapsed - how long processing every message took, in seconds
+    """
+    pending = iter(messages)
+    prefixLength = len(bot.prefix)
+
+    async def worker():
+        for message in pending:
+            response, postCommand = await bot.processCommand(message, message.content[prefixLength:])
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for i in range(concurrency)])
+    await bot.background.drain()
+    return time.perf_counter() - start
+
+
+def benchmarkPipeline(commands: int = 50, aliases: int = 2, arguments: int = 3, users: int = 1000, messages: int = 20000, concurrency: int = 16, seed: int = 0, fileCommands: int = 2) -> dict[str, float]:
+    """
+    Measure throughput and per-stage latency of processCommand on a synthetic bot
+    Parameters:
+        commands, aliases, arguments, users, fileCommands - the shape of the bot, see buildBot
+
+        messages - the number of messages to process
+
+        concurrency - the number of messages processed at once
+
+        seed - the random seed
+    Returns:
+        results - throughput in messages per second, and p50/p95/p99 latencies in seconds, keyed by "pipeline/<metric>"
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        bot = buildBot(directory, commands, aliases, arguments, users, seed, fileCommands)
+        recorder = StageRecorder()
+        bot.addObserver(recorder)
+        batch = buildMessages(bot, messages, users, seed=seed)
+        elapsed = asyncio.run(runLoad(bot, batch, concurrency))
+        bot.executor.shutdown()
+
+    results = {"pipeline/throughput": messages / elapsed}
+    for q in (0.5, 0.95, 0.99):
+        results[f"pipeline/total/p{int(q*100)}"] = percentile(recorder.totals, q)
+        for stage, samples in recorder.stages.items():
+            results[f"pipeline/{stage}/p{int(q*100)}"] = percentile(samples, q)
+
+    return results
+
+
+def compareResults(baseline: dict[str, float], results: dict[str, float], tolerance: float = 0.1) -> list[str]:
+    """
+    Compare results against a saved baseline
+    Parameters:
+        baseline - previously saved results
+
+        results - the new results
+
+        tolerance - how much worse a metric may get before it counts as a regression, as a fraction
+    Returns:
+        regressions - a description of every metric that got worse by more than the tolerance
+    """
+    regressions = []
+    for name, value in results.items():
+        if not name in baseline or baseline[name] == 0:
+            continue
+
+        change = (value - baseline[name]) / baseline[name]
+        if name.endswith("throughput"):
+            change = -change # Throughput regresses when it falls, everything else is a time
+
+        if change > tolerance:
+            regressions.append(f"{name}: {baseline[name]:.6g} -> {value:.6g} ({change*100:+.1f}% worse)")
+
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark cobble's command pipeline, exiting with 1 if the tokenizer disagrees with the legacy splitter")
+    parser.add_argument("--commands", type=int, default=50, help="number of commands on the bot")
+    parser.add_argument("--aliases", type=int, default=2, help="aliases per command")
+    parser.add_argument("--arguments", type=int, default=3, help="arguments per command")
+    parser.add_argument("--file-commands", type=int, default=2, help="commands taking a file, whose messages carry an attachment")
+    parser.add_argument("--users", type=int, default=1000, help="users in the permissions file")
+    parser.add_argument("--messages", type=int, default=20000, help="messages to process")
+    parser.add_argument("--concurrency", type=int, default=16, help="messages processed at once")
+    parser.add_argument("--save", help="write the results to this file as a baseline")
+    parser.add_argument("--compare", help="compare the results with a baseline file, exiting with 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed slowdown before a metric counts as a regression")
+    options = parser.parse_args()
+
+    mismatches = checkTokenizerEquivalence()
+    print(f"Tokenizer equivalence: {mismatches} mismatches")
+
+    results = {}
+    for name, seconds in benchmarkTokenizer().items():
+        results[f"tokenizer/{name}"] = seconds
+    results.update(benchmarkPipeline(options.commands, options.aliases, options.arguments, options.users, options.messages, options.concurrency, fileCommands=options.file_commands))
+
+    for name, value in results.items():
+        if name.endswith("throughput"):
+            print(f"{name}: {value:.0f} messages/s")
+        else:
+            print(f"{name}: {value*1e6:.1f}us")
+
+    if options.save:
+        with open(options.save, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if options.compare:
+        with open(options.compare, "r") as f:
+            baseline = json.load(f)
+        regressions = compareResults(baseline, results, options.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if len(regressions) > 0:
+            return 1
+
+    return 1 if mismatches > 0 else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
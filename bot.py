@@ -1,13 +1,73 @@
 import cobble.command
+import cobble.database
+import cobble.attachments
+import cobble.background
+import cobble.executor
+import cobble.metrics
+import cobble.pagination
+import cobble.permissions
+import cobble.ratelimit
+import cobble.sender
+import cobble.slowlog
+import cobble.tokenizer
+import cobble.validations
+import asyncio
+import contextlib
+import inspect
 import json
+import time
 import discord
 class Bot:
-    def __init__(self, configFilePath: str, permissionsPath: str, name: str, prefix: str = ".", db = None):
+    def __init__(self, configFilePath: str, permissionsPath: str, name: str, prefix: str = ".", db: cobble.database.ConnectionPool = None, permissionBackend: cobble.permissions.PermissionBackend = None, executor: cobble.executor.CommandExecutor = None, userRateLimit: cobble.ratelimit.RateLimit = None, commandTimeout: float = None, slowLog: cobble.slowlog.SlowCommandLog = None, background: cobble.background.TaskQueue = None):
+        """
+        Parameters:
+            configFilePath - A path to a .json file containing the bot's token
+
+            permissionsPath - A path to the .json file containing permissions
+
+            name - The name of the bot
+
+            prefix - The prefix that marks a message as a command
+
+            db - A database connection pool, such as a cobble.database.SQLitePool, that commands declaring usesDatabase are given connections from
+
+            permissionBackend - Where permissions are stored. Defaults to the shared PermissionStore for permissionsPath
+
+            executor - Runs commands and enforces concurrency limits. Defaults to a CommandExecutor with default limits
+
+            userRateLimit - How often each user may use any command, or None for no limit
+
+            commandTimeout - The longest any command may execute, in seconds, unless it sets its own timeout. None for no limit
+
+            slowLog - Where to record commands that take too long, see cobble.slowlog.SlowCommandLog, or None to not record them
+
+            background - Runs postCommand hooks. Defaults to a TaskQueue with default limits, using executor's thread pool
+        """
         self.loadConfig(configFilePath)
         self.name = name
         self.prefix = prefix
         self.permissionsPath = permissionsPath
+        if permissionBackend == None:
+            permissionBackend = cobble.permissions.getStore(permissionsPath)
+        self.permissions = permissionBackend
+        if executor == None:
+            executor = cobble.executor.CommandExecutor()
+        self.executor = executor
+        if background == None:
+            background = cobble.background.TaskQueue(executor)
+        self.background = background
+        self.userRateLimiter = None
+        if userRateLimit != None:
+            self.userRateLimiter = cobble.ratelimit.RateLimiter(userRateLimit)
         self.commands = []
+        self.triggers = {}
+        self.commandMask = 0 # every permission some command requires
+        self.listCache = {}
+        self.observers = []
+        self.commandTimeout = commandTimeout
+        self.slowLog = slowLog
+        self.sender = cobble.sender.OutboundSender()
+        self.paginations = cobble.pagination.PaginationManager()
         self.db = db
 
     def addCommand(self, command: cobble.command.Command):
@@ -16,7 +76,29 @@ class Bot:
         Parameters:
             command - A preconfigured Command object
         """
+        if type(command.trigger) == list:
+            triggers = command.trigger
+        else:
+            triggers = [command.trigger]
+
+        if command.usesDatabase and not isinstance(self.db, cobble.database.ConnectionPool):
+            raise ValueError(f"{command.name} uses the database, but the bot's db isn't a connection pool!")
+
+        if len(set(triggers)) != len(triggers):
+            raise ValueError(f"{command.name} lists the same trigger more than once!")
+
+        for trigger in triggers:
+            if trigger in self.triggers:
+                raise ValueError(f"Trigger \"{trigger}\" of {command.name} is already registered to {self.triggers[trigger].name}!")
+
+        command.compilePlan()
+        for trigger in triggers:
+            self.triggers[trigger] = command
+
+        command.permissionBit = self.permissions.bits.bit(command.permission)
         self.commands.append(command)
+        self.commandMask |= command.permissionBit
+        self.listCache.clear()
 
     def loadConfig(self, configFilePath: str) -> None:
             """
@@ -36,120 +118,323 @@ class Bot:
             fullString - the entire command string, as inputted by the user, excluding the prefix
         Returns:
             response - the response to be sent back to the user either containing the requested information, or just as confirmation.
+
+            postCommand - always None. The command's postCommand is queued on the bot's background queue instead
         """
         
+        trace = None
+        if len(self.observers) > 0 or self.slowLog != None:
+            trace = cobble.metrics.Trace(self.observers, self.slowLog, fullString)
+
+        userID = str(messageObject.author.id)
+        if self.userRateLimiter != None:
+            retryAfter = self.userRateLimiter.acquire(userID)
+            if retryAfter > 0:
+                return self.reject(trace, cobble.metrics.RATE_LIMITED, f"You're using commands too quickly! Try again in {retryAfter:.1f} seconds.")
+        if trace: trace.mark(cobble.metrics.RATE_LIMIT)
+
         # Ensure the command exists
-        processedCommand = None
         trigger = fullString.split(" ")[0].lower()
-        for command in self.commands:
-            if type(command.trigger) == str:
-                if trigger == command.trigger:
-                    processedCommand = command
-            else:
-                if trigger in command.trigger:
-                    processedCommand = command
+        processedCommand = self.triggers.get(trigger)
 
         if processedCommand == None:
-            return f"Command \"{trigger}\" unknown!", None
+            return self.reject(trace, cobble.metrics.UNKNOWN_COMMAND, f"Command \"{trigger}\" unknown!")
+        if trace:
+            trace.command = processedCommand.name
+            trace.mark(cobble.metrics.LOOKUP)
         
-        perms = cobble.permissions.getUserPermissions(str(messageObject.author.id), self.permissionsPath)
-        if not processedCommand.permission == "default" and not ("admin" in perms):
-            if not processedCommand.permission in perms:
-                return "User does not have permission to perform this action!", None
-        
-        # We want to not split on spaces that are inside quotation marks, so we'll keep track of whether we're currently inside a quote block
-        inQuotes = False
-
-        commandElements = []
-        element = ""
-        for character in fullString:
-            match character:
-                case '"' | '“' | '”': # Phones use these stupid characters sometimes
-                    inQuotes = not inQuotes
-
-                case " ":
-                    if not inQuotes:
-                        if not element == "":
-                            commandElements.append(element)
-                        element = ""
-                    else:
-                        element += character
-
-                case _:
-                    element += character
-
-        if not element == "":
-            commandElements.append(element)
+        if not self.getPermissionMask(messageObject) & processedCommand.permissionBit:
+            return self.reject(trace, cobble.metrics.PERMISSION_DENIED, "User does not have permission to perform this action!")
+        if trace: trace.mark(cobble.metrics.PERMISSIONS)
 
+        if processedCommand.rateLimiter != None:
+            retryAfter = processedCommand.rateLimiter.acquire(userID)
+            if retryAfter > 0:
+                return self.reject(trace, cobble.metrics.RATE_LIMITED, f"{processedCommand.name} is on cooldown! Try again in {retryAfter:.1f} seconds.")
+        if trace: trace.mark(cobble.metrics.RATE_LIMIT)
+        
+        # Spaces inside quotation marks don't split elements
+        commandElements = cobble.tokenizer.split(fullString)
         commandElements.pop(0)
+        if trace: trace.mark(cobble.metrics.TOKENIZE)
 
-        usage = cobble.command.HelpCommand.generateUsage("", self, processedCommand)
-        if len(messageObject.attachments) < len(processedCommand.fileArguments):
-            return f"Not enough files supplied!\n{processedCommand.name} takes at least {len(processedCommand.fileArguments)}, but {len(messageObject.attachments)} were supplied!", None
+        plan = processedCommand.plan
+        attachmentCount = len(messageObject.attachments)
+        if attachmentCount < plan.fileCount:
+            return self.reject(trace, cobble.metrics.WRONG_FILE_COUNT, f"Not enough files supplied!\n{processedCommand.name} takes at least {plan.fileCount}, but {attachmentCount} were supplied!")
         
-        if len(messageObject.attachments) > len(processedCommand.fileArguments):
-            return f"Too many files supplied!\n{processedCommand.name} takes up to {len(processedCommand.fileArguments)}, but {len(messageObject.attachments)} were supplied!", None
+        if attachmentCount > plan.fileCount:
+            return self.reject(trace, cobble.metrics.WRONG_FILE_COUNT, f"Too many files supplied!\n{processedCommand.name} takes up to {plan.fileCount}, but {attachmentCount} were supplied!")
+        if trace: trace.mark(cobble.metrics.ATTACHMENTS)
 
 
-        if len(commandElements) > len(processedCommand.arguments):
-            return f"Too many arguments supplied!\nUsage:\n"+usage+"\nAre you trying to give a value with spaces in it? Wrap it in quotes to mark it as one argument.", None
+        if len(commandElements) > plan.argumentCount:
+            return self.reject(trace, cobble.metrics.WRONG_ARGUMENT_COUNT, f"Too many arguments supplied!\nUsage:\n"+processedCommand.getUsage()+"\nAre you trying to give a value with spaces in it? Wrap it in quotes to mark it as one argument.")
 
-        if len(commandElements) < len(processedCommand.mandatoryArgs):
-            return f"Not enough arguments supplied!\nUsage:\n"+usage, None
+        if len(commandElements) < plan.mandatoryCount:
+            return self.reject(trace, cobble.metrics.WRONG_ARGUMENT_COUNT, f"Not enough arguments supplied!\nUsage:\n"+processedCommand.getUsage())
         
         argumentValues = {}
 
-        for index, arg in enumerate(processedCommand.mandatoryArgs):
-            if arg.validation.validate(commandElements[index]):
-                part = commandElements[index]
-                if not arg.caseSensitive:
-                    part = part.lower()
-                    
-                argumentValues[arg.name] = part
-
-            else:
-                return f"{commandElements[index]} is not a valid value for {arg.name}! {arg.validation.requirements}!", None
+        for index, currentElement in enumerate(commandElements):
+            if index < plan.mandatoryCount:
+                identifiedArgument = plan.positional[index]
+                key = identifiedArgument.name
+                value = currentElement
 
-        mandatoryArgsOffset = len(processedCommand.mandatoryArgs)
-        for i in range(len(commandElements)-mandatoryArgsOffset):
-            currentElement = commandElements[i+mandatoryArgsOffset]
-            if not "=" in currentElement:
-                key = processedCommand.keywordArgs[i].name
+            elif not "=" in currentElement:
+                identifiedArgument = plan.keywordOrder[index-plan.mandatoryCount]
+                key = identifiedArgument.name
                 value = currentElement
+
             else:
                 parts = currentElement.split("=")
                 if len(parts) != 2:
-                    return f"Mangled input '{currentElement}!'", None
+                    return self.reject(trace, cobble.metrics.MANGLED_INPUT, f"Mangled input '{currentElement}!'")
                 key = parts[0]
                 value = parts[1]
 
+                identifiedArgument = plan.keywordArgs.get(key)
+                if identifiedArgument == None:
+                    return self.reject(trace, cobble.metrics.UNKNOWN_ARGUMENT, f"Unknown argument: {key}")
             
-            if not key in [arg.name for arg in processedCommand.keywordArgs]:   
-                return f"Unknown argument: {key}", None
-            else:
-                for arg in processedCommand.keywordArgs:
-                    if key == arg.name:
-                        identifiedArgument = arg
-            
-            if identifiedArgument.validation.validate(value):
-                if not identifiedArgument.caseSensitive:
-                    value = value.lower()
-                argumentValues[key] = value
-            else:
-                return f"{value} is not a valid value for {key}! {identifiedArgument.validation.requirements}!", None
+            convertedValue = identifiedArgument.validation.convert(value)
+            if convertedValue is cobble.validations.INVALID:
+                return self.reject(trace, cobble.metrics.INVALID_ARGUMENT, f"{value} is not a valid value for {key}! {identifiedArgument.validation.requirements}!")
+
+            if not identifiedArgument.caseSensitive and type(convertedValue) == str:
+                convertedValue = convertedValue.lower()
+            argumentValues[key] = convertedValue
+        if trace: trace.mark(cobble.metrics.VALIDATION)
 
         attachedFiles = {}
-        for index, arg in enumerate(processedCommand.fileArguments):
-            if arg.fileType == messageObject.attachments[index].filename.split(".")[-1]:
-                attachedFiles[arg.name] = messageObject.attachments[index]
+        if plan.fileCount > 0:
+            # Everything that can be checked without downloading is, so bad files are turned away before fetching any
+            for index, arg in enumerate(plan.fileArguments):
+                attachment = messageObject.attachments[index]
+                if not cobble.attachments.hasExtension(attachment.filename, plan.fileTypes[index]):
+                    return self.reject(trace, cobble.metrics.INVALID_FILE, f"{attachment.filename} is not a valid file for {arg.name}! Must be of filetype {arg.fileType}!")
 
-            else:
-                return f"{messageObject.attachments[index].filename} is not a valid file for {arg.name}! Must be of filetype {arg.fileType}!", None
+                if plan.maxSizes[index] != None and attachment.size > plan.maxSizes[index]:
+                    return self.reject(trace, cobble.metrics.INVALID_FILE, f"{attachment.filename} is too large for {arg.name}! Must be at most {plan.maxSizes[index]} bytes!")
+
+            try:
+                files = await cobble.attachments.fetchAll(messageObject.attachments[:plan.fileCount], plan.deliveries)
+            except (discord.HTTPException, OSError):
+                return self.reject(trace, cobble.metrics.INVALID_FILE, "Couldn't download the supplied files!")
+
+            for index, arg in enumerate(plan.fileArguments):
+                if not cobble.attachments.matchesType(plan.fileTypes[index], files[index].header):
+                    cobble.attachments.closeAll(files)
+                    return self.reject(trace, cobble.metrics.INVALID_FILE, f"{files[index].filename} is not a valid file for {arg.name}! Must be of filetype {arg.fileType}!")
+                attachedFiles[arg.name] = files[index]
+        if trace: trace.mark(cobble.metrics.ATTACHMENTS)
+
+        if not trace:
+            try:
+                response = await self.runCommand(processedCommand, messageObject, argumentValues, attachedFiles)
+            except asyncio.TimeoutError:
+                return f"{processedCommand.name} took too long to respond!", None
+            self.schedulePostCommand(processedCommand)
+            return response, None
+
+        capture = contextlib.nullcontext()
+        if self.slowLog != None:
+            capture = trace.capture = self.slowLog.capture()
+
+        try:
+            with capture:
+                response = await self.runCommand(processedCommand, messageObject, argumentValues, attachedFiles)
+        except asyncio.TimeoutError:
+            trace.mark(cobble.metrics.EXECUTE)
+            return self.reject(trace, cobble.metrics.TIMEOUT, f"{processedCommand.name} took too long to respond!")
+        except BaseException:
+            trace.mark(cobble.metrics.EXECUTE)
+            trace.finish(cobble.metrics.ERROR)
+            raise
+
+        trace.mark(cobble.metrics.EXECUTE)
+        trace.finish(cobble.metrics.OK)
+        self.schedulePostCommand(processedCommand)
+        return response, None
+
+
+    def setPermissionBackend(self, backend: cobble.permissions.PermissionBackend) -> None:
+        """
+        Switch to a different permission backend, such as a shared database
+        Parameters:
+            backend - the backend to use from now on
+        """
+        self.permissions = backend
+        self.commandMask = 0
+        for command in self.commands:
+            command.permissionBit = backend.bits.bit(command.permission)
+            self.commandMask |= command.permissionBit
+        self.listCache.clear()
+
+
+    def getPermissionMask(self, messageObject: discord.message) -> int:
+        """
+        Returns the mask of permissions the author of a message has, from their own grants and those of their roles and guild
+        Parameters:
+            messageObject - the message whose author to check
+        """
+        author = messageObject.author
+        guild = getattr(messageObject, "guild", None)
+        roleIDs = tuple(str(role.id) for role in getattr(author, "roles", ()))
+        return self.permissions.getPermissionMask(str(author.id), roleIDs, str(guild.id) if guild != None else None)
+
+
+    def reject(self, trace: cobble.metrics.Trace, outcome: str, response: str) -> tuple[str, None]:
+        """
+        Finish processing a command that won't be executed
+        Parameters:
+            trace - the command's trace, or None if nothing is observing
+
+            outcome - why the command was rejected
+
+            response - the message to send back to the user
+        """
+        if trace:
+            trace.finish(outcome)
+        return response, None
+
+
+    def schedulePostCommand(self, command: cobble.command.Command) -> None:
+        """
+        Queue a command's postCommand on the background queue, unless it doesn't have one
+        Parameters:
+            command - the command that was executed
+        """
+        if type(command).postCommand is cobble.command.Command.postCommand:
+            return
+
+        postCommand = command.postCommand
+        if len(self.observers) > 0:
+            postCommand = self.observePostCommand(command)
+        self.background.submit(postCommand, command.name, command.postCommandRetries)
+
+
+    def observePostCommand(self, command: cobble.command.Command):
+        """
+        Wrap a command's postCommand so observers receive how long it took
+        Parameters:
+            command - the command whose postCommand to wrap
+        """
+        def report(start: float) -> None:
+            seconds = time.perf_counter() - start
+            for observer in self.observers:
+                observer.stage(command.name, cobble.metrics.POST_COMMAND, seconds)
+
+        if inspect.iscoroutinefunction(command.postCommand):
+            async def postCommand(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await command.postCommand(*args, **kwargs)
+                finally:
+                    report(start)
+
+            return postCommand
+
+        def postCommand(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return command.postCommand(*args, **kwargs)
+            finally:
+                report(start)
+
+        return postCommand
+
+
+    def addObserver(self, observer: cobble.metrics.Observer) -> None:
+        """
+        Report the timing of every stage and the outcome of every command to an observer
+        Parameters:
+            observer - A cobble.metrics.Observer, such as a MetricsAggregator
+        """
+        self.observers.append(observer)
+        if isinstance(observer, cobble.metrics.MetricsAggregator) and isinstance(self.db, cobble.database.ConnectionPool):
+            observer.watchPool("db", self.db)
+
+
+    async def runCommand(self, command: cobble.command.Command, messageObject: discord.message, argumentValues: dict, attachedFiles: dict):
+        """
+        Execute a validated command, sharing the execution with identical invocations if the command coalesces
+        Parameters:
+            command - the command to run
+
+            messageObject, argumentValues, attachedFiles - passed on to the command's execute
+        Returns:
+            response - whatever the command returned, with pages from an async generator wrapped in a cobble.pagination.PagedResponse
+        """
+        timeout = command.timeout if command.timeout != None else self.commandTimeout
+
+        # Pages from a generator can only be consumed once, so they are never shared
+        if command.coalesce and len(attachedFiles) == 0 and not inspect.isasyncgenfunction(command.execute):
+            return await self.runCoalesced(command, messageObject, argumentValues, attachedFiles, timeout)
+
+        paged = False
+        try:
+            response = await self.executeCommand(command, messageObject, argumentValues, attachedFiles, timeout)
+            if hasattr(response, "__aiter__"):
+                paged = True
+                response = cobble.pagination.PagedResponse(response, command.pagination, messageObject.author, self.paginations)
+        finally:
+            if not paged: # A generator may still be reading its files, so they are left for it to close
+                cobble.attachments.closeAll(attachedFiles.values())
+
+        return response
+
+
+    async def executeCommand(self, command: cobble.command.Command, messageObject: discord.message, argumentValues: dict, attachedFiles: dict, timeout: float):
+        """
+        Execute a command through the executor, lending it a database connection for the invocation if it uses one
+        """
+        if not command.usesDatabase:
+            return await self.executor.run(command, messageObject, argumentValues, attachedFiles, timeout)
+
+        # The connection is only taken once the command has its concurrency slots, so a queued command doesn't hold one
+        taken = []
+        async def takeConnection():
+            taken.append(await self.db.get())
+            return {"db": taken[0]}
+
+        try:
+            response = await self.executor.run(command, messageObject, argumentValues, attachedFiles, timeout, takeConnection)
+        except BaseException:
+            if len(taken) > 0:
+                await self.db.release(taken[0])
+            raise
+
+        connection = taken[0]
+
+        # Pages streamed straight away may still need the connection, but pages turned by reactions can be
+        # waited on for as long as the paginator lives, which would keep the connection from every other command
+        if hasattr(response, "__aiter__") and command.pagination != cobble.pagination.REACTIONS:
+            return cobble.database.releaseAfter(response, self.db, connection)
+
+        await self.db.release(connection)
+        return response
+
+
+    async def runCoalesced(self, command: cobble.command.Command, messageObject: discord.message, argumentValues: dict, attachedFiles: dict, timeout: float):
+        try:
+            key = frozenset(argumentValues.items())
+            hash(key)
+        except TypeError: # Some validation produced an unhashable value
+            return await self.executeCommand(command, messageObject, argumentValues, attachedFiles, timeout)
+
+        if command.resultCache != None:
+            found, response = command.resultCache.get(key)
+            if found:
+                return response
+
+        response = await command.singleFlight.run(key, lambda: self.executeCommand(command, messageObject, argumentValues, attachedFiles, timeout))
 
+        if command.resultCache != None:
+            command.resultCache.put(key, response)
 
-        response = await processedCommand.execute(messageObject, argumentValues, attachedFiles)
-    
-        return response, processedCommand.postCommand
+        return response
                         
 
 
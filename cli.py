@@ -0,0 +1,164 @@
+import cobble.bot
+import cobble.database
+import cobble.fakegateway
+import cobble.pagination
+import argparse
+import asyncio
+import importlib
+import importlib.util
+import json
+import os
+import sys
+
+def loadBot(definition: str) -> "cobble.bot.Bot":
+    """
+    Load a bot from a definition of the form "module:attribute" or "path/to/file.py:attribute"
+    Parameters:
+        definition - where to find the bot. The attribute may be a Bot, or a function returning one
+    """
+    location, _, attribute = definition.rpartition(":")
+    if location == "":
+        raise ValueError(f"Bot definition \"{definition}\" must be of the form module:attribute")
+
+    if location.endswith(".py"):
+        # The module is registered under its file name, with its directory on the path, so PROCESS commands defined
+        # in it can be pickled by reference and imported again by worker processes
+        directory = os.path.dirname(os.path.abspath(location))
+        if directory not in sys.path:
+            sys.path.insert(0, directory)
+
+        name = os.path.splitext(os.path.basename(location))[0]
+        spec = importlib.util.spec_from_file_location(name, location)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[name]
+            raise
+    else:
+        module = importlib.import_module(location)
+
+    bot = getattr(module, attribute)
+    if not isinstance(bot, cobble.bot.Bot):
+        bot = bot()
+    return bot
+
+
+def parseLine(line: str, defaultUser: str) -> dict:
+    """
+    Turn a line of input into a request. A line is either a JSON object such as
+    {"command": ".help list", "user": "1234", "attachments": [{"path": "report.csv"}]}, or just the command itself
+    Parameters:
+        line - the line of input
+
+        defaultUser - the user ID to run as when the line doesn't give one
+    """
+    stripped = line.strip()
+    if stripped.startswith("{"):
+        request = json.loads(stripped)
+    else:
+        request = {"command": stripped}
+
+    request.setdefault("user", defaultUser)
+    return request
+
+
+def makeMessage(gateway: "cobble.fakegateway.FakeGateway", request: dict) -> "cobble.fakegateway.FakeMessage":
+    attachments = []
+    for attachment in request.get("attachments", []):
+        with open(attachment["path"], "rb") as f:
+            data = f.read()
+        attachments.append(cobble.fakegateway.FakeAttachment(attachment.get("filename", os.path.basename(attachment["path"])), data))
+
+    return cobble.fakegateway.FakeMessage(gateway.getUser(int(request["user"])), request["command"], gateway.getChannel(0), attachments)
+
+
+async def run(bot: "cobble.bot.Bot", lines, defaultUser: str, concurrency: int, output) -> int:
+    """
+    Run every command in a stream of lines through the bot, writing one JSON result per line as each finishes
+    Parameters:
+        bot - the bot to run the commands with
+
+        lines - an iterable of input lines
+
+        defaultUser - the user ID to run as when a line doesn't give one
+
+        concurrency - how many commands run at once
+
+        output - where to write results
+    Returns:
+        failures - the number of commands that raised an exception
+    """
+    gateway = cobble.fakegateway.FakeGateway(rateLimit=None)
+    pending = enumerate(lines)
+    reading = asyncio.Lock()
+    failures = 0
+
+    async def nextLine():
+        # Reading, i.e. from stdin, blocks until a line arrives, so it happens in a thread while commands keep running.
+        # One worker reads at a time, since the iterator can't be advanced from two threads at once
+        async with reading:
+            return await asyncio.to_thread(next, pending, None)
+
+    async def worker():
+        nonlocal failures
+        while True:
+            item = await nextLine()
+            if item == None:
+                return
+
+            index, line = item
+            if line.strip() == "":
+                continue
+
+            result = {"index": index}
+            try:
+                request = parseLine(line, defaultUser)
+                result["id"] = request.get("id")
+                result["user"] = str(request["user"])
+                result["command"] = request["command"]
+                fullString = request["command"]
+                if fullString.startswith(bot.prefix):
+                    fullString = fullString[len(bot.prefix):]
+
+                response, postCommand = await bot.processCommand(makeMessage(gateway, request), fullString)
+                if isinstance(response, cobble.pagination.PagedResponse):
+                    response = await response.collect()
+                result["response"] = response if response == None or type(response) == str else str(response)
+            except Exception as e:
+                failures += 1
+                result["error"] = f"{type(e).__name__}: {e}"
+
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+
+    await asyncio.gather(*[worker() for i in range(concurrency)])
+    await bot.background.drain()
+    if isinstance(bot.db, cobble.database.ConnectionPool):
+        await bot.db.close()
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run cobble bot commands without a discord connection, reading one command per line and writing JSONL results")
+    parser.add_argument("bot", help="the bot to load, as module:attribute or path/to/file.py:attribute")
+    parser.add_argument("--user", required=True, help="the discord user ID to run commands as, unless a line gives its own")
+    parser.add_argument("--input", help="a file of commands or JSONL requests, defaults to stdin")
+    parser.add_argument("--concurrency", type=int, default=8, help="how many commands run at once")
+    options = parser.parse_args()
+
+    bot = loadBot(options.bot)
+    if options.input:
+        with open(options.input, "r") as f:
+            failures = asyncio.run(run(bot, f, options.user, options.concurrency, sys.stdout))
+    else:
+        failures = asyncio.run(run(bot, sys.stdin, options.user, options.concurrency, sys.stdout))
+
+    bot.permissions.flush()
+    bot.executor.shutdown()
+    return 1 if failures > 0 else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
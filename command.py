@@ -1,7 +1,13 @@
 import cobble.validations
-import cobble.permissions
+import cobble.attachments
 import cobble.bot
+import cobble.executor
+import cobble.pagination
+import cobble.ratelimit
+import cobble.singleflight
 import discord
+import inspect
+import types
 
 class Argument:
     def __init__(self, name: str, description: str, validation: cobble.validations.Validation, keywordArg: bool = False, caseSensitive: bool = False) -> None:
@@ -23,21 +29,49 @@ class Argument:
 
 
 class FileArgument:
-    def __init__(self, name: str, description: str, fileType: str) -> None:
+    def __init__(self, name: str, description: str, fileType: str, maxSize: int = None, delivery: str = cobble.attachments.BYTES) -> None:
         """
         Parameters: 
             name - the name of the argument, to be used when addressing the user, such as in help menus
             description - a description of the argument, to be used when addressing the user
-            fileType - the requested file type
+            fileType - the requested file type, checked against both the extension and the file's contents
+            maxSize - the largest file accepted, in bytes, or None for no limit
+            delivery - how the downloaded file is passed to execute, as a cobble.attachments.AttachedFile holding
+                       bytes (cobble.attachments.BYTES), a spooled temporary file (SPOOLED) or a memory map (MMAP)
         """
         self.name = name
         self.description = description
         self.fileType = fileType
+        self.maxSize = maxSize
+        self.delivery = delivery
+
+
+
+class ArgumentPlan:
+    def __init__(self, arguments: list[Argument], fileArguments: list[FileArgument]) -> None:
+        """
+        A precompiled, read-only description of how to parse a command's arguments, so that parsing an invocation
+        is a single pass over its tokens with dictionary lookups for keyword arguments.
+        Parameters:
+            arguments - the command's arguments, in the order they were added
+
+            fileArguments - the command's file arguments, in the order they were added
+        """
+        self.positional = tuple(argument for argument in arguments if not argument.keywordArg)
+        self.keywordOrder = tuple(argument for argument in arguments if argument.keywordArg)
+        self.keywordArgs = types.MappingProxyType({argument.name: argument for argument in self.keywordOrder})
+        self.mandatoryCount = len(self.positional)
+        self.argumentCount = len(arguments)
+        self.fileArguments = tuple(fileArguments)
+        self.fileTypes = tuple(argument.fileType for argument in fileArguments)
+        self.maxSizes = tuple(argument.maxSize for argument in fileArguments)
+        self.deliveries = tuple(argument.delivery for argument in fileArguments)
+        self.fileCount = len(fileArguments)
 
 
 
 class Command:
-    def __init__(self, bot: 'cobble.bot.Bot', name: str, trigger: str, description: str, permission: str = "default", hidden: bool = False) -> None:
+    def __init__(self, bot: 'cobble.bot.Bot', name: str, trigger: str, description: str, permission: str = "default", hidden: bool = False, executionMode: str = cobble.executor.INLINE, concurrencyLimit: int = None, rateLimit: cobble.ratelimit.RateLimit = None, coalesce: bool = False, resultCacheTTL: float = None, resultCacheSize: int = 128, pagination: str = cobble.pagination.STREAM, timeout: float = None, postCommandRetries: int = None, usesDatabase: bool = False) -> None:
         """
         Parameters:
             bot - The bot object the command will belong to
@@ -47,6 +81,33 @@ class Command:
             trigger - the phrase used to activate the command, usually with a set prefix i.e "help"
 
             permissionLevel - the authorisation a user is required to have in order to use this command.
+
+            executionMode - how the command is run, one of cobble.executor.INLINE, THREAD or PROCESS.
+                            THREAD commands define execute as a regular function, PROCESS commands define a static compute(argumentValues) instead
+
+            concurrencyLimit - the most invocations of this command that may run at once, or None for no limit beyond the bot's
+
+            rateLimit - how often each user may use this command, i.e. RateLimit.cooldown(30), or None for no limit
+
+            coalesce - whether concurrent invocations with the same argument values and no attachments share a single execution.
+                       Only suitable for commands whose response depends on nothing but their arguments
+
+            resultCacheTTL - for coalesced commands, how many seconds a response is reused for later identical invocations, or None to not reuse responses
+
+            resultCacheSize - the most responses kept in the result cache
+
+            pagination - if execute is an async generator producing pages, how they are delivered, either
+                         cobble.pagination.STREAM or cobble.pagination.REACTIONS
+
+            timeout - the longest execute may run before it is cancelled and the user told it took too long, in seconds.
+                      None uses the bot's commandTimeout. Pages produced after execute returns aren't covered
+
+            postCommandRetries - how many times postCommand is tried again if it raises, or None for the bot's background queue default
+
+            usesDatabase - whether execute is given a connection from the bot's db pool, as the keyword argument db.
+                           The connection is the command's alone until execute returns, or until all its pages have been produced.
+                           Not available to PROCESS commands. Pages turned by REACTIONS may be produced long after the command
+                           has finished, so those commands give the connection back when execute returns, and their pages can't use it
         """
         self.bot = bot
         self.name = name
@@ -57,11 +118,31 @@ class Command:
             self.mainTrigger = self.trigger
         self.description = description
         self.permission = permission
+        self.permissionBit = None # assigned by the bot when the command is added
         self.hidden = hidden
+        self.executionMode = executionMode
+        self.concurrencyLimit = concurrencyLimit
+        self.rateLimiter = None
+        if rateLimit != None:
+            self.rateLimiter = cobble.ratelimit.RateLimiter(rateLimit)
+        self.coalesce = coalesce
+        self.singleFlight = cobble.singleflight.SingleFlight()
+        self.resultCache = None
+        if resultCacheTTL != None:
+            self.resultCache = cobble.singleflight.ResultCache(resultCacheTTL, resultCacheSize)
+        self.pagination = pagination
+        self.timeout = timeout
+        self.postCommandRetries = postCommandRetries
+        if usesDatabase and executionMode == cobble.executor.PROCESS:
+            raise ValueError(f"{name} runs in another process, so can't be given a database connection!")
+        if usesDatabase and pagination == cobble.pagination.REACTIONS and inspect.isasyncgenfunction(getattr(self, "execute", None)):
+            raise ValueError(f"{name} produces its pages as they are turned, after its database connection has been given back! Query in execute and return the pages instead")
+        self.usesDatabase = usesDatabase
         self.arguments = []
         self.fileArguments = []
         self.mandatoryArgs = []
         self.keywordArgs = []
+        self.compilePlan()
 
 
     def addArgument(self, argument: Argument):
@@ -77,6 +158,8 @@ class Command:
         else:
             self.keywordArgs.append(argument)
 
+        self.compilePlan()
+
     def addFileArgument(self, argument: FileArgument):
         """
         Add a file argument to the command
@@ -84,8 +167,67 @@ class Command:
             argument - A preconfigured FileArgument object
         """
         self.fileArguments.append(argument)
+        self.compilePlan()
+
+    def compilePlan(self):
+        """
+        Rebuild the command's ArgumentPlan from its current arguments, and discard any usage or help text rendered for the old ones
+        """
+        self.plan = ArgumentPlan(self.arguments, self.fileArguments)
+        self.usage = None
+        self.helpText = None
+
+    def getUsage(self) -> str:
+        """
+        Returns the usage string for the command, i.e. "`.command argument [keyword=value]`", rendering it on first use
+        """
+        if self.usage == None:
+            parts = [f"`{self.bot.prefix}{self.mainTrigger}"]
+            for argument in self.arguments:
+                if not argument.keywordArg:
+                    parts.append(argument.name)
+                else:
+                    parts.append(f"[{argument.name}=value]")
+
+            self.usage = " ".join(parts) + "`"
+
+        return self.usage
+
+    def getHelpText(self) -> str:
+        """
+        Returns the help menu for the command, rendering it on first use
+        """
+        if self.helpText == None:
+            lines = [f"Help for {self.name}:", self.getUsage()]
+            for argument in self.arguments:
+                lines.append(f"{argument.name} - {argument.description}, {argument.validation.requirements}")
+
+            if len(self.fileArguments) > 0:
+                lines.append("")
+                lines.append("File Arguments:")
+                for fileArgument in self.fileArguments:
+                    lines.append(f"{fileArgument.name} - {fileArgument.description}, Must be of type {fileArgument.fileType}")
+
+            lines.append("")
+            lines.append("Arguments in [brackets] are optional.")
+            self.helpText = "\n".join(lines)
+
+        return self.helpText
+
+    @staticmethod
+    def compute(argumentValues: dict) -> str:
+        """
+        Produce the response for a command using the PROCESS execution mode. Runs in a worker process, so it only receives the arguments
+        Parameters:
+            argumentValues - a dictionary containing values for every argument provided, keyed to the argument name
+        """
+        raise NotImplementedError
 
     def postCommand(self):
+        """
+        Follow-up work run in the background after a successful execution, such as logging or database writes.
+        Runs in the thread pool, or on the event loop if overridden with a coroutine function
+        """
         pass
 
 
@@ -97,23 +239,10 @@ class HelpCommand(Command):
             bot - The bot object the command will belong to
         """
         super().__init__(bot, "Help", "help", "Get help with any commands")
-        self.addArgument(Argument("command", "The command you wish to know more about", cobble.validations.IsCommand(self.bot.commands), True))
+        self.addArgument(Argument("command", "The command you wish to know more about", cobble.validations.IsCommand(self.bot.triggers), True))
 
     def generateUsage(self, bot, commandToUse):
-        usage = f"`{bot.prefix}{commandToUse.mainTrigger}"
-        
-        for argument in commandToUse.arguments:
-            usage += " "
-            if not argument.keywordArg:
-                argText = argument.name
-            else:
-                argText = f"[{argument.name}=value]"
-
-            usage += argText
-
-        usage += "`"
-
-        return usage
+        return commandToUse.getUsage()
 
 
     async def execute(self, messageObject: discord.message, argumentValues: dict, attachedFiles: dict) -> None:
@@ -125,70 +254,98 @@ class HelpCommand(Command):
         if not "command" in argumentValues:
             return await ListCommand.execute(self, messageObject, argumentValues, attachedFiles)
 
-        for command in self.bot.commands:
-            if type(command.trigger) == list:
-                if argumentValues["command"] in command.trigger:
-                    commandToUse = command
-                    break
-            else:
-                if argumentValues["command"] == command.trigger:
-                    commandToUse = command
-                    break
+        commandToUse = self.bot.triggers[argumentValues["command"]]
 
-    
-        finalOutput = ""
+        return commandToUse.getHelpText()
+            
+
+            
 
-        finalOutput += f"Help for {commandToUse.name}:\n"
         
-        usage = self.generateUsage(self.bot, commandToUse)
+class ListCommand(Command):
+    def __init__(self, bot: "cobble.bot.Bot"):
+        """
+        Parameters:
+            bot - The bot object the command will belong to
+        """
+        super().__init__(bot, "List", "list", "List every command available to you")
+
+
+    async def execute(self, messageObject: discord.message, argumentValues: dict, attachedFiles: dict) -> None:
+        """
+        Generate a help menu for a given command
+        Parameters:
+            argumentValues - a dictionary containing values for every argument provided, keyed to the argument name
+        """
+        return ListCommand.renderList(self.bot, self.bot.getPermissionMask(messageObject))
 
-        finalOutput += usage
 
+    @staticmethod
+    def renderList(bot: "cobble.bot.Bot", mask: int) -> str:
+        """
+        Returns the list of commands available with a set of permissions.
 
-        for argument in commandToUse.arguments:
-            finalOutput += "\n"
-            finalOutput += f"{argument.name} - {argument.description}, {argument.validation.requirements}"
+        Lists are cached on the bot, keyed by the permissions that decide which commands are shown,
+        so users with equivalent permissions share one rendered list.
+        Parameters:
+            bot - The bot whose commands to list
 
+            mask - The permission mask of the user asking
+        """
+        key = mask & bot.commandMask
 
-        if len(commandToUse.fileArguments) > 0:
-            finalOutput += "\n\nFile Arguments:"
-            for fileArgument in commandToUse.fileArguments:
-                finalOutput += "\n"
-                finalOutput += f"{fileArgument.name} - {fileArgument.description}, Must be of type {fileArgument.fileType}"
+        output = bot.listCache.get(key)
+        if output != None:
+            return output
 
+        lines = ["Available commands:"]
+        for command in bot.commands:
 
-        finalOutput += "\n\nArguments in [brackets] are optional."
+            if key & command.permissionBit:
+                if not command.hidden:
+                    lines.append(f"`{command.mainTrigger}` - {command.description}")
 
-        return finalOutput
-            
 
-            
+        lines.append("")
+        lines.append("Use the help command for more information on any command")
 
-        
-class ListCommand(Command):
+        output = "\n".join(lines)
+        bot.listCache[key] = output
+        return output
+
+
+
+class SlowCommandsCommand(Command):
     def __init__(self, bot: "cobble.bot.Bot"):
         """
+        A hidden admin command showing the invocations recorded in the bot's slow command log
         Parameters:
             bot - The bot object the command will belong to
         """
-        super().__init__(bot, "List", "list", "List every command available to you")
+        super().__init__(bot, "Slow Commands", "slowcommands", "Inspect recent slow commands", permission="admin", hidden=True)
+        self.addArgument(Argument("entry", "The number of a recorded command to show in full", cobble.validations.IsInteger(), True))
 
 
-    async def execute(self, messageObject: discord.message, argumentValues: dict, attachedFiles: dict) -> None:
+    async def execute(self, messageObject: discord.message, argumentValues: dict, attachedFiles: dict) -> str:
         """
-        Generate a help menu for a given command
+        List the recorded slow commands, or show one in full with its stage timings and profile
         Parameters:
             argumentValues - a dictionary containing values for every argument provided, keyed to the argument name
         """
-        perms = cobble.permissions.getUserPermissions(str(messageObject.author.id), self.bot.permissionsPath)
-        output = "Available commands:"
-        for command in self.bot.commands:
+        slowLog = self.bot.slowLog
+        if slowLog == None:
+            return "Slow command capture isn't enabled!"
 
-            if command.permission == "default" or command.permission in perms or "admin" in perms:
-                if not command.hidden:
-                    output += f"\n`{command.mainTrigger}` - {command.description}"
+        if "entry" in argumentValues:
+            entry = slowLog.get(argumentValues["entry"])
+            if entry == None:
+                return f"Slow command #{argumentValues['entry']} isn't recorded!"
+            return entry.details()
 
+        if len(slowLog.entries) == 0:
+            return f"No commands have taken longer than {slowLog.threshold}s yet."
 
-        output += "\n\nUse the help command for more information on any command"
+        lines = [f"Commands that took longer than {slowLog.threshold}s, newest first:"]
+        lines.extend(entry.summary() for entry in reversed(slowLog.entries))
+        return "\n".join(lines)
 
-        return output
\ No newline at end of file
@@ -0,0 +1,410 @@
+import cobble.metrics
+import asyncio
+import collections
+import concurrent.futures
+import contextlib
+import functools
+import logging
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(asyncio.TimeoutError):
+    """
+    Raised when no connection became free within a pool's acquireTimeout
+    """
+    pass
+
+
+
+class ConnectionPool:
+    def __init__(self, minSize: int = 1, maxSize: int = 10, acquireTimeout: float = 10.0, healthCheckInterval: float = 30.0, idleTimeout: float = 300.0) -> None:
+        """
+        Shares a limited number of database connections between commands. Subclasses implement connecting to a particular database.
+
+        Connections are handed out most recently used first, and a connection that has sat idle for longer than healthCheckInterval
+        is checked before it is handed out, so one dropped by the server is replaced rather than given to a command.
+        When every connection is in use, acquirers wait their turn in order, for at most acquireTimeout.
+
+        Use a connection with
+            async with pool.acquire() as connection:
+                ...
+        or declare usesDatabase on a Command to be given one for each invocation. Call close() when done with the pool.
+
+        Parameters:
+            minSize - the number of connections opened up front and kept open even while idle
+
+            maxSize - the most connections open at once
+
+            acquireTimeout - the longest to wait for a free connection, in seconds, before raising PoolTimeout. None to wait forever
+
+            healthCheckInterval - how long a connection may sit idle before it is checked again before use, in seconds. None to never check
+
+            idleTimeout - how long a connection beyond minSize may sit idle before it is closed, in seconds
+        """
+        self.minSize = minSize
+        self.maxSize = maxSize
+        self.acquireTimeout = acquireTimeout
+        self.healthCheckInterval = healthCheckInterval
+        self.idleTimeout = idleTimeout
+        self.idle = [] # (connection, time it was released), most recently released last
+        self.waiters = collections.deque() # futures of acquirers waiting for a connection, oldest first
+        self.size = 0 # connections open or being opened
+        self.opened = False
+        self.closed = False
+        self.acquired = 0
+        self.created = 0
+        self.discarded = 0
+        self.timeouts = 0
+        self.waitTimes = cobble.metrics.Histogram()
+
+
+    async def connect(self):
+        """
+        Open a new connection
+        """
+        raise NotImplementedError
+
+
+    async def check(self, connection) -> bool:
+        """
+        Returns whether a connection still works
+        """
+        return True
+
+
+    async def reset(self, connection) -> None:
+        """
+        Put a connection back into a clean state before it is reused, i.e. by rolling back an unfinished transaction
+        """
+        pass
+
+
+    async def disconnect(self, connection) -> None:
+        """
+        Close a connection
+        """
+        raise NotImplementedError
+
+
+    async def open(self) -> None:
+        """
+        Open the first minSize connections. Called automatically by the first acquire if not called before
+        """
+        if self.opened:
+            return
+
+        self.opened = True
+        while self.size < self.minSize:
+            self.size += 1
+            try:
+                connection = await self.connect()
+            except BaseException:
+                self.size -= 1
+                raise
+            self.created += 1
+            self.idle.append((connection, time.monotonic()))
+
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        """
+        Borrow a connection for the duration of an async with block
+        """
+        connection = await self.get()
+        try:
+            yield connection
+        finally:
+            await self.release(connection)
+
+
+    async def get(self):
+        """
+        Take a connection, waiting if they are all in use. Every connection taken must be given back with release()
+        Raises:
+            PoolTimeout - if no connection became free within acquireTimeout
+        """
+        if self.closed:
+            raise RuntimeError("The connection pool is closed")
+        if not self.opened:
+            await self.open()
+
+        start = time.monotonic()
+        while True:
+            while len(self.idle) > 0:
+                connection, releasedAt = self.idle.pop()
+                if self.healthCheckInterval != None and time.monotonic() - releasedAt > self.healthCheckInterval:
+                    if not await self.isHealthy(connection):
+                        await self.discard(connection)
+                        continue
+                return self.taken(connection, start)
+
+            if self.size < self.maxSize:
+                self.size += 1
+                try:
+                    connection = await self.connect()
+                except BaseException:
+                    self.size -= 1
+                    self.wakeWaiter(None)
+                    raise
+                self.created += 1
+                return self.taken(connection, start)
+
+            remaining = None
+            if self.acquireTimeout != None:
+                remaining = start + self.acquireTimeout - time.monotonic()
+
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                connection = await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise PoolTimeout(f"No database connection became free within {self.acquireTimeout} seconds")
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled(): # Handed a connection just as the acquirer was cancelled
+                    self.putBack(waiter.result())
+                raise
+            finally:
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+
+            if connection != None: # Otherwise a connection was closed, making room to open another
+                return self.taken(connection, start)
+
+
+    def taken(self, connection, start: float):
+        self.acquired += 1
+        self.waitTimes.add(time.monotonic() - start)
+        return connection
+
+
+    async def isHealthy(self, connection) -> bool:
+        try:
+            return await self.check(connection)
+        except Exception:
+            return False
+
+
+    async def release(self, connection) -> None:
+        """
+        Give a connection back to the pool
+        """
+        try:
+            await self.reset(connection)
+        except Exception:
+            logger.warning("Couldn't reset a database connection, closing it", exc_info=True)
+            await self.discard(connection)
+            return
+
+        if self.closed:
+            self.size -= 1
+            await self.disconnect(connection)
+            return
+
+        self.putBack(connection)
+        await self.prune()
+
+
+    def putBack(self, connection) -> None:
+        if connection == None:
+            self.wakeWaiter(None)
+        elif not self.wakeWaiter(connection):
+            self.idle.append((connection, time.monotonic()))
+
+
+    def wakeWaiter(self, connection) -> bool:
+        """
+        Hand a connection straight to the longest waiting acquirer, if any is still waiting.
+        A connection of None tells them there is room to open a new one
+        """
+        while len(self.waiters) > 0:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(connection)
+                return True
+        return False
+
+
+    async def discard(self, connection) -> None:
+        """
+        Close a connection that is broken, making room for a new one
+        """
+        self.discarded += 1
+        self.size -= 1
+        try:
+            await self.disconnect(connection)
+        except Exception:
+            pass
+        self.wakeWaiter(None)
+
+
+    async def prune(self) -> None:
+        """
+        Close connections beyond minSize that have been idle for longer than idleTimeout
+        """
+        now = time.monotonic()
+        while self.size > self.minSize and len(self.idle) > 0 and now - self.idle[0][1] > self.idleTimeout:
+            connection, releasedAt = self.idle.pop(0)
+            self.size -= 1
+            await self.disconnect(connection)
+
+
+    async def close(self) -> None:
+        """
+        Close every idle connection. Connections in use are closed as they are released
+        """
+        self.closed = True
+        idle = self.idle
+        self.idle = []
+        for connection, releasedAt in idle:
+            self.size -= 1
+            await self.disconnect(connection)
+
+
+    def stats(self) -> dict:
+        """
+        Returns the pool's current size and usage, and counters since it was created
+        """
+        return {
+            "size": self.size,
+            "idle": len(self.idle),
+            "inUse": self.size - len(self.idle),
+            "waiting": sum(1 for waiter in self.waiters if not waiter.done()),
+            "minSize": self.minSize,
+            "maxSize": self.maxSize,
+            "acquired": self.acquired,
+            "created": self.created,
+            "discarded": self.discarded,
+            "timeouts": self.timeouts,
+            "waitSeconds": self.waitTimes.snapshot()
+        }
+
+
+
+async def releaseAfter(pages, pool: ConnectionPool, connection):
+    """
+    Pass on the pages of an async generator, giving a connection back to the pool once they are finished or abandoned
+    """
+    try:
+        async for page in pages:
+            yield page
+    finally:
+        await pool.release(connection)
+
+
+
+class SQLiteConnection:
+    def __init__(self, pool: "SQLitePool", connection: sqlite3.Connection) -> None:
+        """
+        A pooled SQLite connection whose blocking calls run in the pool's thread pool.
+
+        Commands running in the thread pool themselves can use the underlying sqlite3 connection directly, as .connection
+
+        Parameters:
+            pool - the pool the connection belongs to
+
+            connection - the sqlite3 connection
+        """
+        self.pool = pool
+        self.connection = connection
+
+
+    async def run(self, function, *args):
+        """
+        Call a blocking function in the pool's thread pool
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool.threadPool, functools.partial(function, *args))
+
+
+    def fetch(self, sql: str, parameters) -> list:
+        return self.connection.execute(sql, parameters).fetchall()
+
+
+    async def execute(self, sql: str, parameters = ()) -> list:
+        """
+        Run a statement
+        Returns:
+            Every row it produced
+        """
+        return await self.run(self.fetch, sql, parameters)
+
+
+    async def executemany(self, sql: str, parameters) -> int:
+        """
+        Run a statement once for each set of parameters
+        Returns:
+            The number of rows changed
+        """
+        return await self.run(lambda: self.connection.executemany(sql, parameters).rowcount)
+
+
+    async def executescript(self, script: str) -> None:
+        await self.run(self.connection.executescript, script)
+
+
+    async def commit(self) -> None:
+        await self.run(self.connection.commit)
+
+
+    async def rollback(self) -> None:
+        await self.run(self.connection.rollback)
+
+
+
+class SQLitePool(ConnectionPool):
+    def __init__(self, databasePath: str, minSize: int = 1, maxSize: int = 5, acquireTimeout: float = 10.0, healthCheckInterval: float = 30.0, idleTimeout: float = 300.0, pragmas: tuple[str] = ("PRAGMA journal_mode=WAL", "PRAGMA busy_timeout=5000")) -> None:
+        """
+        A connection pool for an SQLite database. Every blocking call runs in a thread pool with a thread per connection,
+        so queries never stall the event loop or wait behind commands in the bot's own thread pool.
+
+        Anything left uncommitted when a connection is released is rolled back.
+
+        Parameters:
+            databasePath - the path to the database file, which is created if it doesn't exist
+
+            minSize, maxSize, acquireTimeout, healthCheckInterval, idleTimeout - see ConnectionPool
+
+            pragmas - statements run on every new connection
+        """
+        super().__init__(minSize, maxSize, acquireTimeout, healthCheckInterval, idleTimeout)
+        self.databasePath = databasePath
+        self.pragmas = pragmas
+        self.threadPool = concurrent.futures.ThreadPoolExecutor(max_workers=maxSize, thread_name_prefix="cobble-db")
+
+
+    def openConnection(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.databasePath, check_same_thread=False)
+        for pragma in self.pragmas:
+            connection.execute(pragma)
+        return connection
+
+
+    async def connect(self) -> SQLiteConnection:
+        loop = asyncio.get_running_loop()
+        return SQLiteConnection(self, await loop.run_in_executor(self.threadPool, self.openConnection))
+
+
+    async def check(self, connection: SQLiteConnection) -> bool:
+        await connection.execute("SELECT 1")
+        return True
+
+
+    async def reset(self, connection: SQLiteConnection) -> None:
+        if connection.connection.in_transaction:
+            await connection.rollback()
+
+
+    async def disconnect(self, connection: SQLiteConnection) -> None:
+        connection.connection.close() # Quick, and works after the thread pool has been shut down
+
+
+    async def close(self) -> None:
+        """
+        Close every idle connection and stop the thread pool once the connections in use have been released
+        """
+        await super().close()
+        self.threadPool.shutdown(wait=False)
@@ -0,0 +1,174 @@
+import cobble.bot
+import cobble.database
+import asyncio
+import discord
+import logging
+
+logger = logging.getLogger(__name__)
+
+# What to do with a command that arrives while the queue is full
+REJECT = "reject" # turn the new command away
+DROP_OLDEST = "dropOldest" # discard the longest-waiting command to make room
+
+def listen(client: discord.Client, handler) -> None:
+    """
+    Register an event handler named after its event, i.e. on_message, without replacing one already registered
+    """
+    if hasattr(client, "add_listener"):
+        client.add_listener(handler, handler.__name__)
+        return
+
+    existing = getattr(client, handler.__name__, None)
+    if existing == None:
+        client.event(handler)
+        return
+
+    async def chained(*args):
+        try:
+            await handler(*args)
+        finally:
+            await existing(*args)
+
+    chained.__name__ = handler.__name__
+    client.event(chained)
+
+
+
+class Dispatcher:
+    def __init__(self, bot: "cobble.bot.Bot", workers: int = 4, queueSize: int = 256, overflow: str = REJECT, rejectMessage: str = None) -> None:
+        """
+        Feeds messages from a discord client into a bot.
+
+        Messages that don't start with the bot's prefix are dropped before anything else is done with them.
+        Commands are queued and processed by a fixed number of workers, so a burst of commands can't pile up unbounded tasks.
+
+        Parameters:
+            bot - The bot to process commands with
+
+            workers - the number of commands processed at once
+
+            queueSize - the most commands that may wait to be processed
+
+            overflow - what to do when the queue is full, either REJECT or DROP_OLDEST
+
+            rejectMessage - sent back to the user when their command is rejected, or None to reject silently
+        """
+        self.bot = bot
+        self.workerCount = workers
+        self.queueSize = queueSize
+        self.overflow = overflow
+        self.rejectMessage = rejectMessage
+        self.client = None
+        self.queue = None
+        self.workers = []
+        self.rejected = 0
+        self.dropped = 0
+
+
+    def attach(self, client: discord.Client) -> None:
+        """
+        Start receiving messages and reactions from a client. Handlers for on_message and on_reaction_add that are already
+        registered keep working: clients with add_listener, such as discord.ext.commands.Bot, get extra listeners, and
+        on a plain discord.Client, which has one handler per event, the existing handler is called after the dispatcher's
+        Parameters:
+            client - The discord client to listen to
+        """
+        self.client = client
+
+        async def on_message(message):
+            await self.receive(message)
+
+        async def on_reaction_add(reaction, user):
+            if user != client.user:
+                await self.bot.paginations.onReaction(reaction, user)
+
+        listen(client, on_message)
+        listen(client, on_reaction_add)
+
+
+    def startWorkers(self) -> None:
+        """
+        Create the queue and start the workers, if they aren't running already. Must be called from the event loop
+        """
+        if len(self.workers) > 0:
+            return
+
+        self.queue = asyncio.Queue(self.queueSize)
+        self.workers = [asyncio.create_task(self.work()) for i in range(self.workerCount)]
+
+
+    async def receive(self, message: discord.message) -> None:
+        """
+        Queue a message for processing if it is a command
+        Parameters:
+            message - The received message
+        """
+        content = message.content
+        if not content or not content.startswith(self.bot.prefix):
+            return
+
+        if self.client != None and message.author == self.client.user:
+            return
+
+        self.startWorkers()
+
+        if self.queue.full():
+            if self.overflow == DROP_OLDEST:
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self.dropped += 1
+            else:
+                self.rejected += 1
+                if self.rejectMessage != None:
+                    self.bot.sender.send(message.channel, self.rejectMessage)
+                return
+
+        self.queue.put_nowait(message)
+
+
+    async def work(self) -> None:
+        while True:
+            message = await self.queue.get()
+            try:
+                await self.handle(message)
+            except Exception:
+                logger.exception("Failed to process command %r", message.content)
+            finally:
+                self.queue.task_done()
+
+
+    async def handle(self, message: discord.message) -> None:
+        """
+        Process a single command and send the response
+        Parameters:
+            message - The message containing the command
+        """
+        response, postCommand = await self.bot.processCommand(message, message.content[len(self.bot.prefix):])
+        if response:
+            self.bot.sender.send(message.channel, response)
+
+
+    async def join(self) -> None:
+        """
+        Wait until every queued command has been processed, its response sent and its postCommand run
+        """
+        if self.queue != None:
+            await self.queue.join()
+        await self.bot.sender.join()
+        await self.bot.background.join()
+
+
+    async def stop(self) -> None:
+        """
+        Stop the workers. Commands still in the queue are discarded, but the postCommand hooks of commands already
+        processed are drained from the bot's background queue, after which the bot's db pool is closed
+        """
+        for worker in self.workers:
+            worker.cancel()
+
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        self.queue = None
+        await self.bot.background.drain()
+        if isinstance(self.bot.db, cobble.database.ConnectionPool):
+            await self.bot.db.close()
@@ -0,0 +1,141 @@
+import cobble.slowlog
+import asyncio
+import concurrent.futures
+import functools
+import inspect
+
+# Execution modes a command can declare
+INLINE = "inline" # execute is a coroutine, awaited on the event loop
+THREAD = "thread" # execute is a regular function, run in the shared thread pool
+PROCESS = "process" # the command's static compute(argumentValues) function is run in the shared process pool
+
+
+class CommandExecutor:
+    def __init__(self, maxConcurrency: int = 64, threadWorkers: int = None, processWorkers: int = None) -> None:
+        """
+        Runs commands according to their execution mode, so blocking commands don't stall the event loop.
+
+        At most maxConcurrency commands run at once across the whole bot, and a command that sets a concurrencyLimit
+        never has more than that many invocations running. Invocations over either limit wait their turn.
+
+        Parameters:
+            maxConcurrency - the most commands that may run at once
+
+            threadWorkers - the size of the thread pool, defaults to the ThreadPoolExecutor default
+
+            processWorkers - the size of the process pool, defaults to the number of CPUs
+        """
+        self.maxConcurrency = maxConcurrency
+        self.threadWorkers = threadWorkers
+        self.processWorkers = processWorkers
+        self.globalLimit = asyncio.Semaphore(maxConcurrency)
+        self.commandLimits = {}
+        self.threadPool = None
+        self.processPool = None
+
+
+    def getThreadPool(self) -> concurrent.futures.ThreadPoolExecutor:
+        if self.threadPool == None:
+            self.threadPool = concurrent.futures.ThreadPoolExecutor(max_workers=self.threadWorkers, thread_name_prefix="cobble")
+        return self.threadPool
+
+
+    def getProcessPool(self) -> concurrent.futures.ProcessPoolExecutor:
+        if self.processPool == None:
+            self.processPool = concurrent.futures.ProcessPoolExecutor(max_workers=self.processWorkers)
+        return self.processPool
+
+
+    def getCommandLimit(self, command) -> asyncio.Semaphore:
+        """
+        Returns the semaphore enforcing a command's concurrencyLimit, or None if it doesn't have one
+        """
+        if command.concurrencyLimit == None:
+            return None
+
+        limit = self.commandLimits.get(command)
+        if limit == None:
+            limit = asyncio.Semaphore(command.concurrencyLimit)
+            self.commandLimits[command] = limit
+        return limit
+
+
+    async def run(self, command, messageObject, argumentValues: dict, attachedFiles: dict, timeout: float = None, prepare = None):
+        """
+        Execute a command once both the global and the command's own concurrency limits allow it
+        Parameters:
+            command - the command to execute
+
+            messageObject, argumentValues, attachedFiles - passed on to the command's execute
+
+            timeout - the longest the execution may take once it has started, in seconds, or None for no limit.
+                      Waiting for the concurrency limits doesn't count
+
+            prepare - an async function called once the concurrency limits allow the execution, returning extra keyword arguments
+                      for execute, such as db. Anything it takes, such as a database connection, isn't held while waiting for the limits.
+                      Its time doesn't count towards timeout. Not used for PROCESS commands
+        Returns:
+            response - whatever the command returned
+        Raises:
+            asyncio.TimeoutError - if the execution took longer than timeout. An INLINE execution is cancelled, but one already
+                                   running in the thread or process pool can't be stopped and runs to completion unobserved
+        """
+        commandLimit = self.getCommandLimit(command)
+        if commandLimit == None:
+            async with self.globalLimit:
+                return await self.start(command, messageObject, argumentValues, attachedFiles, timeout, prepare)
+
+        async with commandLimit:
+            async with self.globalLimit:
+                return await self.start(command, messageObject, argumentValues, attachedFiles, timeout, prepare)
+
+
+    async def start(self, command, messageObject, argumentValues: dict, attachedFiles: dict, timeout: float, prepare):
+        context = None
+        if prepare != None:
+            context = await prepare()
+        return await self.runWithin(self.dispatch(command, messageObject, argumentValues, attachedFiles, context), timeout)
+
+
+    async def runWithin(self, coroutine, timeout: float):
+        if timeout == None:
+            return await coroutine
+
+        # wait_for runs the coroutine in a task of its own, which a sampling slow log can't find by following awaits
+        task = asyncio.ensure_future(coroutine)
+        cobble.slowlog.follow(task)
+        return await asyncio.wait_for(task, timeout)
+
+
+    async def dispatch(self, command, messageObject, argumentValues: dict, attachedFiles: dict, context: dict = None):
+        if context == None:
+            context = {}
+
+        if command.executionMode == THREAD:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.getThreadPool(), functools.partial(command.execute, messageObject, argumentValues, attachedFiles, **context))
+
+        if command.executionMode == PROCESS:
+            # Discord objects can't be sent to another process, so only the arguments go
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.getProcessPool(), type(command).compute, argumentValues)
+
+        response = command.execute(messageObject, argumentValues, attachedFiles, **context)
+        if inspect.isawaitable(response): # An async generator execute returns its pages without being awaited
+            response = await response
+        return response
+
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Shut down the thread and process pools
+        Parameters:
+            wait - whether to wait for running work to finish
+        """
+        if self.threadPool != None:
+            self.threadPool.shutdown(wait=wait)
+            self.threadPool = None
+
+        if self.processPool != None:
+            self.processPool.shutdown(wait=wait)
+            self.processPool = None
@@ -0,0 +1,440 @@
+import cobble.benchmark
+import asyncio
+import discord
+import io
+import itertools
+import json
+import time
+
+ids = itertools.count(1)
+
+
+class FakeUser:
+    def __init__(self, id: int, name: str = None, roles: list = None, bot: bool = False) -> None:
+        """
+        Stands in for a discord user or member
+        Parameters:
+            id - the user's ID
+
+            name - the user's name, defaults to one made from the ID
+
+            roles - the user's roles
+
+            bot - whether the user is a bot
+        """
+        self.id = id
+        self.name = name or f"user{id}"
+        self.roles = roles or []
+        self.bot = bot
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, FakeUser) and other.id == self.id
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+
+
+class FakeRole:
+    def __init__(self, id: int, name: str = None) -> None:
+        """
+        Stands in for a discord role
+        """
+        self.id = id
+        self.name = name or f"role{id}"
+
+
+
+class FakeGuild:
+    def __init__(self, id: int, name: str = None) -> None:
+        """
+        Stands in for a discord guild
+        """
+        self.id = id
+        self.name = name or f"guild{id}"
+
+
+
+class FakeAttachment:
+    def __init__(self, filename: str, data: bytes = b"", contentType: str = None) -> None:
+        """
+        Stands in for a discord attachment
+        Parameters:
+            filename - the name of the file
+
+            data - the contents of the file
+
+            contentType - the MIME type discord would report
+        """
+        self.id = next(ids)
+        self.filename = filename
+        self.data = data
+        self.size = len(data)
+        self.content_type = contentType
+
+    async def read(self) -> bytes:
+        return self.data
+
+    async def save(self, fp, seek_begin: bool = True) -> int:
+        # Like discord.Attachment.save, anything but a buffered binary file is taken to be a path
+        if isinstance(fp, io.BufferedIOBase):
+            written = fp.write(self.data)
+            if seek_begin:
+                fp.seek(0)
+            return written
+
+        with open(fp, "wb") as f:
+            return f.write(self.data)
+
+
+
+class FakeHTTPResponse:
+    def __init__(self, status: int, reason: str, headers: dict) -> None:
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+
+
+
+class SentMessage:
+    def __init__(self, channel: "FakeChannel", content: str, sentAt: float, inReplyTo: "FakeMessage" = None) -> None:
+        """
+        A message the bot sent
+        Parameters:
+            channel - where it was sent
+
+            content - what was sent
+
+            sentAt - when it was sent, by time.perf_counter()
+
+            inReplyTo - the message whose channel it was sent through, if known
+        """
+        self.id = next(ids)
+        self.channel = channel
+        self.content = content
+        self.sentAt = sentAt
+        self.inReplyTo = inReplyTo
+        self.answers = [] if inReplyTo == None else [inReplyTo] # every message it responds to, including those whose responses were merged into it
+        self.reactions = []
+        self.edits = []
+
+    async def edit(self, content: str = None, **kwargs) -> "SentMessage":
+        self.edits.append((time.perf_counter(), content))
+        self.content = content
+        return self
+
+    async def add_reaction(self, emoji: str) -> None:
+        self.reactions.append(emoji)
+
+
+
+class FakeReaction:
+    def __init__(self, message: SentMessage, emoji: str) -> None:
+        """
+        Stands in for a reaction added to a message
+        """
+        self.message = message
+        self.emoji = emoji
+
+
+
+class FakeChannel:
+    def __init__(self, gateway: "FakeGateway", id: int, rateLimit: int = 5, ratePeriod: float = 5.0, raiseOnRateLimit: bool = False) -> None:
+        """
+        Stands in for a discord text channel, recording everything sent to it.
+
+        Sends are limited the way discord limits them per channel. By default a send over the limit waits,
+        as discord.py does after a 429. With raiseOnRateLimit it raises a discord.HTTPException with status 429 and
+        the rate limit headers instead.
+
+        Parameters:
+            gateway - the gateway the channel belongs to
+
+            id - the channel's ID
+
+            rateLimit - the most sends allowed per ratePeriod, or None for no limit
+
+            ratePeriod - the length of the rate limit window, in seconds
+
+            raiseOnRateLimit - whether to raise instead of waiting when the limit is hit
+        """
+        self.gateway = gateway
+        self.id = id
+        self.rateLimit = rateLimit
+        self.ratePeriod = ratePeriod
+        self.raiseOnRateLimit = raiseOnRateLimit
+        self.sendTimes = []
+        self.rateLimited = 0
+
+
+    def retryAfter(self, now: float) -> float:
+        """
+        Returns how long until another send is allowed, or 0 if one is allowed now
+        """
+        if self.rateLimit == None:
+            return 0
+
+        self.sendTimes = [sentAt for sentAt in self.sendTimes if sentAt > now - self.ratePeriod]
+        if len(self.sendTimes) < self.rateLimit:
+            return 0
+        return self.sendTimes[0] + self.ratePeriod - now
+
+
+    async def send(self, content: str = None, inReplyTo: "FakeMessage" = None, **kwargs) -> SentMessage:
+        """
+        Record a message as sent to this channel
+        Parameters:
+            content - the message
+
+            inReplyTo - the message being responded to, used to measure latency
+        """
+        while True:
+            now = time.perf_counter()
+            retryAfter = self.retryAfter(now)
+            if retryAfter == 0:
+                break
+
+            self.rateLimited += 1
+            if self.raiseOnRateLimit:
+                headers = {
+                    "Retry-After": str(retryAfter),
+                    "X-RateLimit-Limit": str(self.rateLimit),
+                    "X-RateLimit-Remaining": "0",
+                    "X-RateLimit-Reset-After": str(retryAfter),
+                    "X-RateLimit-Bucket": f"channel-{self.id}"
+                }
+                raise discord.HTTPException(FakeHTTPResponse(429, "Too Many Requests", headers), {"message": "You are being rate limited.", "code": 0, "retry_after": retryAfter})
+
+            await asyncio.sleep(retryAfter)
+
+        self.sendTimes.append(now)
+        sent = SentMessage(self, content, now, inReplyTo)
+        self.gateway.sent.append(sent)
+        return sent
+
+
+
+class ReplyChannel:
+    def __init__(self, channel: FakeChannel, message: "FakeMessage") -> None:
+        """
+        The channel as seen through one received message, so that responses can be matched to the message that caused them
+        """
+        self.channel = channel
+        self.message = message
+        self.id = channel.id
+
+    async def send(self, content: str = None, **kwargs) -> SentMessage:
+        return await self.channel.send(content, inReplyTo=self.message, **kwargs)
+
+    def mergedInto(self, sent: SentMessage) -> None:
+        """
+        Record that the response to this channel's message went out merged into a message sent through another
+        """
+        sent.answers.append(self.message)
+
+
+
+class FakeMessage:
+    def __init__(self, author: FakeUser, content: str, channel: FakeChannel, attachments: list[FakeAttachment] = None, guild: FakeGuild = None) -> None:
+        """
+        Stands in for a received discord message
+        Parameters:
+            author - who sent the message
+
+            content - the text of the message
+
+            channel - where it was sent
+
+            attachments - the files attached to it
+
+            guild - the guild it was sent in, or None for a direct message
+        """
+        self.id = next(ids)
+        self.author = author
+        self.content = content
+        self.channel = ReplyChannel(channel, self)
+        self.attachments = attachments or []
+        self.guild = guild
+        self.receivedAt = None
+
+
+
+class FakeClient:
+    def __init__(self, user: FakeUser = None) -> None:
+        """
+        Stands in for a discord.Client. Event handlers registered with event() are called by the gateway, one per event.
+        Like discord.ext.commands.Bot, any number of listeners can also be added with add_listener()
+        Parameters:
+            user - the bot's own user
+        """
+        self.user = user or FakeUser(0, "bot", bot=True)
+        self.handlers = {}
+        self.listeners = {} # event name -> extra handlers
+
+    def event(self, coroutine):
+        self.handlers[coroutine.__name__] = coroutine
+        return coroutine
+
+    def add_listener(self, coroutine, name: str = None) -> None:
+        self.listeners.setdefault(name or coroutine.__name__, []).append(coroutine)
+
+    async def dispatch(self, event: str, *args) -> None:
+        """
+        Call the handler and listeners for an event, if there are any
+        Parameters:
+            event - the event name without the "on_" prefix, i.e. "message"
+        """
+        handler = self.handlers.get(f"on_{event}")
+        if handler != None:
+            await handler(*args)
+        for listener in self.listeners.get(f"on_{event}", []):
+            await listener(*args)
+
+
+
+class FakeGateway:
+    def __init__(self, client: FakeClient = None, **channelOptions) -> None:
+        """
+        Replays a stream of messages into a client at a controlled rate and records the responses, without any network.
+        Parameters:
+            client - the client to deliver messages to, a new FakeClient by default
+
+            channelOptions - passed on to every FakeChannel, i.e. rateLimit=None to disable send rate limits
+        """
+        self.client = client or FakeClient()
+        self.channelOptions = channelOptions
+        self.channels = {}
+        self.users = {}
+        self.received = []
+        self.sent = []
+
+
+    def getChannel(self, id: int) -> FakeChannel:
+        if not id in self.channels:
+            self.channels[id] = FakeChannel(self, id, **self.channelOptions)
+        return self.channels[id]
+
+
+    def getUser(self, id: int) -> FakeUser:
+        if not id in self.users:
+            self.users[id] = FakeUser(id)
+        return self.users[id]
+
+
+    def makeMessage(self, event: dict) -> FakeMessage:
+        """
+        Build a message from an event of the form
+        {"author": 1, "content": ".help", "channel": 1, "guild": 1, "roles": [5, 6], "attachments": [{"filename": "a.png"}]}.
+        Only content is required. roles are the author's roles in the guild
+        """
+        attachments = [FakeAttachment(attachment["filename"], attachment.get("data", "").encode(), attachment.get("contentType")) for attachment in event.get("attachments", [])]
+        author = self.getUser(event.get("author", 1))
+        if "roles" in event:
+            author = FakeUser(author.id, author.name, [FakeRole(roleID) for roleID in event["roles"]], author.bot)
+
+        guild = None
+        if "guild" in event:
+            guild = FakeGuild(event["guild"])
+
+        return FakeMessage(author, event["content"], self.getChannel(event.get("channel", 1)), attachments, guild)
+
+
+    async def deliver(self, message: FakeMessage) -> None:
+        """
+        Deliver a single message to the client
+        """
+        message.receivedAt = time.perf_counter()
+        self.received.append(message)
+        await self.client.dispatch("message", message)
+
+
+    async def react(self, message: SentMessage, userID: int, emoji: str) -> None:
+        """
+        Add a reaction to a message the bot sent, as a user
+        Parameters:
+            message - the message to react to
+
+            userID - the ID of the user reacting
+
+            emoji - the reaction
+        """
+        await self.client.dispatch("reaction_add", FakeReaction(message, emoji), self.getUser(userID))
+
+
+    async def replay(self, events, rate: float = None) -> None:
+        """
+        Deliver a stream of events to the client in order
+        Parameters:
+            events - an iterable of event dictionaries, see makeMessage. An event may carry a "delay" in seconds to wait before it
+
+            rate - the most messages delivered per second, or None to deliver as fast as possible
+        """
+        start = time.perf_counter()
+        for index, event in enumerate(events):
+            if "delay" in event:
+                await asyncio.sleep(event["delay"])
+
+            if rate != None:
+                wait = start + index / rate - time.perf_counter()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            else:
+                await asyncio.sleep(0) # Let the bot's workers run between messages
+
+            await self.deliver(self.makeMessage(event))
+
+
+    async def settle(self, quietPeriod: float = 0.1, timeout: float = 60) -> None:
+        """
+        Wait until nothing has been sent for quietPeriod seconds, or timeout seconds have passed
+        """
+        deadline = time.perf_counter() + timeout
+        lastCount = -1
+        while time.perf_counter() < deadline:
+            if len(self.sent) == lastCount:
+                return
+            lastCount = len(self.sent)
+            await asyncio.sleep(quietPeriod)
+
+
+    def report(self) -> dict:
+        """
+        Summarise the run so far
+        Returns:
+            A dictionary with the number of messages received and sent, rate limit hits, throughput, and p50/p95/p99 of
+            the time between a message arriving and the first response to it, in seconds
+        """
+        firstResponses = {}
+        for sent in self.sent:
+            for message in sent.answers:
+                if not message.id in firstResponses:
+                    firstResponses[message.id] = sent.sentAt - message.receivedAt
+
+        latencies = list(firstResponses.values())
+        duration = 0
+        if len(self.received) > 0 and len(self.sent) > 0:
+            duration = self.sent[-1].sentAt - self.received[0].receivedAt
+
+        return {
+            "received": len(self.received),
+            "sent": len(self.sent),
+            "answered": len(firstResponses),
+            "rateLimited": sum(channel.rateLimited for channel in self.channels.values()),
+            "throughput": len(firstResponses) / duration if duration > 0 else 0.0,
+            "latency": {f"p{int(q*100)}": cobble.benchmark.percentile(latencies, q) for q in (0.5, 0.95, 0.99)}
+        }
+
+
+
+def loadJSONL(path: str) -> list[dict]:
+    """
+    Read events from a JSONL file, one event dictionary per line
+    Parameters:
+        path - the path to the file
+    """
+    events = []
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip() != "":
+                events.append(json.loads(line))
+    return events
@@ -0,0 +1,292 @@
+import threading
+import time
+
+# Stages of processing a command, in the order they happen
+RATE_LIMIT = "rateLimit"
+LOOKUP = "lookup"
+PERMISSIONS = "permissions"
+TOKENIZE = "tokenize"
+ATTACHMENTS = "attachments"
+VALIDATION = "validation"
+EXECUTE = "execute"
+POST_COMMAND = "postCommand"
+
+# Outcomes of processing a command
+OK = "ok"
+ERROR = "error"
+RATE_LIMITED = "rateLimited"
+UNKNOWN_COMMAND = "unknownCommand"
+PERMISSION_DENIED = "permissionDenied"
+WRONG_FILE_COUNT = "wrongFileCount"
+WRONG_ARGUMENT_COUNT = "wrongArgumentCount"
+MANGLED_INPUT = "mangledInput"
+UNKNOWN_ARGUMENT = "unknownArgument"
+INVALID_ARGUMENT = "invalidArgument"
+INVALID_FILE = "invalidFile"
+TIMEOUT = "timeout"
+
+
+class Observer:
+    def __init__(self) -> None:
+        """
+        Receives timings from a bot. Subclass and override either method, then pass to Bot.addObserver
+        """
+        pass
+
+    def stage(self, command: str, stage: str, seconds: float) -> None:
+        """
+        Called for every stage a command went through
+        Parameters:
+            command - the name of the command, or None if no command matched
+
+            stage - the stage, one of the stage constants in this module
+
+            seconds - how long the stage took
+        """
+        pass
+
+    def outcome(self, command: str, outcome: str, seconds: float) -> None:
+        """
+        Called once for every command processed, after its stages
+        Parameters:
+            command - the name of the command, or None if no command matched
+
+            outcome - how processing ended, one of the outcome constants in this module
+
+            seconds - how long processing took in total, excluding postCommand
+        """
+        pass
+
+
+
+class Trace:
+    def __init__(self, observers: list[Observer], slowLog: "cobble.slowlog.SlowCommandLog" = None, commandLine: str = None) -> None:
+        """
+        Times the stages of processing one command and reports them to observers
+        Parameters:
+            observers - who to report to
+
+            slowLog - where to record the command if it turns out to be slow, or None
+
+            commandLine - the command as the user typed it, for the slow log
+        """
+        self.observers = observers
+        self.slowLog = slowLog
+        self.commandLine = commandLine
+        self.capture = None # the slow log's profile of the execution, if any
+        self.command = None
+        self.stages = {}
+        self.start = time.perf_counter()
+        self.last = self.start
+
+    def mark(self, stage: str) -> None:
+        """
+        Record the time since the previous mark against a stage
+        Parameters:
+            stage - the stage that just ended
+        """
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0) + now - self.last
+        self.last = now
+
+    def finish(self, outcome: str) -> None:
+        """
+        Report the recorded stages and the outcome to every observer
+        Parameters:
+            outcome - how processing ended
+        """
+        total = time.perf_counter() - self.start
+        for observer in self.observers:
+            for stage, seconds in self.stages.items():
+                observer.stage(self.command, stage, seconds)
+            observer.outcome(self.command, outcome, total)
+
+        if self.slowLog != None:
+            self.slowLog.consider(self, outcome, total)
+
+
+
+class Histogram:
+    # Upper bounds of the buckets, in seconds
+    BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf"))
+
+    def __init__(self) -> None:
+        """
+        A latency histogram with fixed buckets
+        """
+        self.counts = [0] * len(self.BOUNDS)
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, seconds: float) -> None:
+        for index, bound in enumerate(self.BOUNDS):
+            if seconds <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile, as the upper bound of the bucket it falls in
+        Parameters:
+            q - the quantile, between 0 and 1
+        """
+        if self.count == 0:
+            return 0.0
+
+        target = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self.BOUNDS[index]
+        return self.BOUNDS[-1]
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": {str(bound): count for bound, count in zip(self.BOUNDS, self.counts)}
+        }
+
+
+
+class MetricsAggregator(Observer):
+    def __init__(self) -> None:
+        """
+        An observer keeping per-command outcome counters and latency histograms in memory,
+        which can be exported as a dictionary or in the Prometheus text format
+        """
+        super().__init__()
+        self.lock = threading.Lock()
+        self.outcomes = {} # (command, outcome) -> count
+        self.stages = {} # (command, stage) -> Histogram
+        self.totals = {} # command -> Histogram
+        self.pools = {} # name -> cobble.database.ConnectionPool
+
+    def watchPool(self, name: str, pool) -> None:
+        """
+        Export a connection pool's stats alongside the command metrics. Bots watch their db pool automatically
+        Parameters:
+            name - what to label the pool's metrics with
+
+            pool - a cobble.database.ConnectionPool
+        """
+        self.pools[name] = pool
+
+    def snapshotPools(self) -> dict:
+        """
+        Returns the stats of every watched connection pool, keyed by name
+        """
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+    def stage(self, command: str, stage: str, seconds: float) -> None:
+        key = (command or "", stage)
+        with self.lock:
+            histogram = self.stages.get(key)
+            if histogram == None:
+                histogram = self.stages[key] = Histogram()
+            histogram.add(seconds)
+
+    def outcome(self, command: str, outcome: str, seconds: float) -> None:
+        command = command or ""
+        key = (command, outcome)
+        with self.lock:
+            self.outcomes[key] = self.outcomes.get(key, 0) + 1
+            histogram = self.totals.get(command)
+            if histogram == None:
+                histogram = self.totals[command] = Histogram()
+            histogram.add(seconds)
+
+    def snapshot(self) -> dict:
+        """
+        Returns every counter and histogram, keyed by command name. Commands that matched nothing are under ""
+        """
+        with self.lock:
+            commands = {}
+            for (command, outcome), count in self.outcomes.items():
+                commands.setdefault(command, {"outcomes": {}, "stages": {}})["outcomes"][outcome] = count
+            for (command, stage), histogram in self.stages.items():
+                commands.setdefault(command, {"outcomes": {}, "stages": {}})["stages"][stage] = histogram.snapshot()
+            for command, histogram in self.totals.items():
+                commands.setdefault(command, {"outcomes": {}, "stages": {}})["total"] = histogram.snapshot()
+            return commands
+
+    def renderPrometheus(self) -> str:
+        """
+        Returns every counter and histogram in the Prometheus text exposition format
+        """
+        lines = [
+            "# HELP cobble_commands_total Commands processed, by outcome",
+            "# TYPE cobble_commands_total counter"
+        ]
+        with self.lock:
+            for (command, outcome), count in sorted(self.outcomes.items()):
+                lines.append(f"cobble_commands_total{{{labels(command=command, outcome=outcome)}}} {count}")
+
+            lines.append("# HELP cobble_command_seconds Time taken to process commands")
+            lines.append("# TYPE cobble_command_seconds histogram")
+            for command, histogram in sorted(self.totals.items()):
+                renderHistogram(lines, "cobble_command_seconds", labels(command=command), histogram)
+
+            lines.append("# HELP cobble_stage_seconds Time taken by each stage of processing commands")
+            lines.append("# TYPE cobble_stage_seconds histogram")
+            for (command, stage), histogram in sorted(self.stages.items()):
+                renderHistogram(lines, "cobble_stage_seconds", labels(command=command, stage=stage), histogram)
+
+        if len(self.pools) > 0:
+            renderPools(lines, self.pools)
+
+        return "\n".join(lines) + "\n"
+
+
+
+def labels(**values: str) -> str:
+    """
+    Render Prometheus labels, escaping their values
+    """
+    rendered = []
+    for name, value in values.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        rendered.append(f'{name}="{value}"')
+    return ",".join(rendered)
+
+
+def renderHistogram(lines: list[str], name: str, labelText: str, histogram: Histogram) -> None:
+    cumulative = 0
+    for bound, count in zip(histogram.BOUNDS, histogram.counts):
+        cumulative += count
+        le = "+Inf" if bound == float("inf") else repr(bound)
+        lines.append(f'{name}_bucket{{{labelText},le="{le}"}} {cumulative}')
+    lines.append(f"{name}_sum{{{labelText}}} {histogram.sum}")
+    lines.append(f"{name}_count{{{labelText}}} {histogram.count}")
+
+
+POOL_GAUGES = (
+    ("size", "cobble_db_pool_size", "Connections open"),
+    ("idle", "cobble_db_pool_idle", "Connections open and not in use"),
+    ("inUse", "cobble_db_pool_in_use", "Connections currently lent out"),
+    ("waiting", "cobble_db_pool_waiting", "Acquirers waiting for a connection")
+)
+POOL_COUNTERS = (
+    ("acquired", "cobble_db_pool_acquired_total", "Times a connection was lent out"),
+    ("created", "cobble_db_pool_created_total", "Connections opened"),
+    ("discarded", "cobble_db_pool_discarded_total", "Connections closed because they failed a health check or reset"),
+    ("timeouts", "cobble_db_pool_timeouts_total", "Acquirers that gave up waiting for a connection")
+)
+
+
+def renderPools(lines: list[str], pools: dict) -> None:
+    stats = {name: pool.stats() for name, pool in pools.items()}
+    for kind, metrics in (("gauge", POOL_GAUGES), ("counter", POOL_COUNTERS)):
+        for key, name, description in metrics:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for pool, values in sorted(stats.items()):
+                lines.append(f"{name}{{{labels(pool=pool)}}} {values[key]}")
+
+    lines.append("# HELP cobble_db_pool_wait_seconds Time spent waiting for a connection")
+    lines.append("# TYPE cobble_db_pool_wait_seconds histogram")
+    for pool in sorted(stats):
+        renderHistogram(lines, "cobble_db_pool_wait_seconds", labels(pool=pool), pools[pool].waitTimes)
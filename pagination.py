@@ -0,0 +1,202 @@
+import cobble.sender
+import asyncio
+import collections
+import time
+
+# How a command's pages are delivered
+STREAM = "stream" # every page is sent as its own message, in order, as soon as it is produced
+REACTIONS = "reactions" # the first page is sent, and reacting with PREVIOUS or NEXT edits the message to show another page
+
+PREVIOUS = "◀️"
+NEXT = "▶️"
+
+FOOTER_ROOM = 32 # Characters kept free in each page for its "Page x/y" footer
+
+
+class PagedResponse:
+    def __init__(self, pages, mode: str, author, manager: "PaginationManager") -> None:
+        """
+        A response made of pages produced one at a time by an async generator
+        Parameters:
+            pages - the async iterator producing the pages
+
+            mode - how the pages are delivered, STREAM or REACTIONS
+
+            author - the user the response is for, the only one who may turn its pages
+
+            manager - keeps track of paginated messages waiting for reactions
+        """
+        self.pages = pages
+        self.mode = mode
+        self.author = author
+        self.manager = manager
+
+
+    async def deliver(self, sender, channel) -> None:
+        """
+        Send the response to a channel
+        Parameters:
+            sender - the bot's OutboundSender, used for every send
+
+            channel - where to send the response
+        """
+        if self.mode == REACTIONS:
+            paginator = Paginator(self.pages, self.author)
+            await paginator.start(sender, channel)
+            self.manager.track(paginator)
+            return
+
+        async for page in self.pages:
+            for piece in cobble.sender.chunk(page):
+                await sender.deliver(channel, piece)
+
+
+    async def collect(self) -> str:
+        """
+        Produce every page and join them into one string, for callers that can't send pages
+        """
+        return "\n".join([page async for page in self.pages])
+
+
+
+class Paginator:
+    def __init__(self, pages, author) -> None:
+        """
+        A message showing one page at a time. Pages are produced only when somebody first turns to them
+        Parameters:
+            pages - the async iterator producing the pages
+
+            author - the user allowed to turn pages
+        """
+        self.source = pages
+        self.author = author
+        self.pages = []
+        self.exhausted = False
+        self.index = 0
+        self.message = None
+        self.lastUsed = time.monotonic()
+        self.lock = asyncio.Lock() # held while producing or turning pages, since reactions arrive concurrently and a generator can't be advanced twice at once
+
+
+    async def getPage(self, index: int) -> str:
+        """
+        Returns a page, producing pages up to it if they haven't been yet, or None if there are fewer pages. Must be called holding the lock.
+        A page too long for one message is split into several, as STREAM mode would send it
+        """
+        while len(self.pages) <= index and not self.exhausted:
+            try:
+                self.pages.extend(cobble.sender.chunk(await self.source.__anext__(), cobble.sender.MESSAGE_LIMIT - FOOTER_ROOM))
+            except StopAsyncIteration:
+                self.exhausted = True
+
+        if index < len(self.pages):
+            return self.pages[index]
+        return None
+
+
+    def render(self, page: str) -> str:
+        footer = f"\n\nPage {self.index + 1}"
+        if self.exhausted:
+            footer += f"/{len(self.pages)}"
+        return page[:cobble.sender.MESSAGE_LIMIT - len(footer)] + footer
+
+
+    async def start(self, sender, channel) -> None:
+        """
+        Send the first page and add the reactions for turning pages
+        """
+        async with self.lock:
+            page = await self.getPage(0)
+            if page == None:
+                return
+
+            self.message = await sender.deliver(channel, self.render(page))
+            await self.getPage(1) # Find out whether there's anything to turn to
+            if len(self.pages) > 1:
+                await self.message.add_reaction(PREVIOUS)
+                await self.message.add_reaction(NEXT)
+
+
+    async def turn(self, emoji: str) -> None:
+        """
+        Show the previous or next page, if there is one
+        Parameters:
+            emoji - PREVIOUS or NEXT
+        """
+        self.lastUsed = time.monotonic()
+        async with self.lock:
+            if emoji == PREVIOUS:
+                index = self.index - 1
+            elif emoji == NEXT:
+                index = self.index + 1
+            else:
+                return
+
+            if index < 0:
+                return
+
+            page = await self.getPage(index)
+            if page == None:
+                return
+
+            self.index = index
+            await self.message.edit(content=self.render(page))
+
+
+    async def close(self) -> None:
+        async with self.lock:
+            if not self.exhausted:
+                await self.source.aclose()
+
+
+
+class PaginationManager:
+    def __init__(self, maxActive: int = 1000, timeout: float = 300) -> None:
+        """
+        Keeps track of paginated messages, so reactions to them can turn their pages
+        Parameters:
+            maxActive - the most paginated messages tracked at once. The least recently used stop responding first
+
+            timeout - how long a paginated message keeps responding after it was last used, in seconds
+        """
+        self.maxActive = maxActive
+        self.timeout = timeout
+        self.active = collections.OrderedDict() # message ID -> Paginator, least recently used first
+
+
+    def track(self, paginator: Paginator) -> None:
+        if paginator.message == None or len(paginator.pages) < 2:
+            return
+
+        self.active[paginator.message.id] = paginator
+        self.expire()
+
+
+    def expire(self) -> None:
+        """
+        Stop tracking paginated messages that have timed out, or that are beyond maxActive
+        """
+        now = time.monotonic()
+        while len(self.active) > 0:
+            messageID, paginator = next(iter(self.active.items()))
+            if len(self.active) <= self.maxActive and paginator.lastUsed + self.timeout > now:
+                break
+            del self.active[messageID]
+            asyncio.ensure_future(paginator.close())
+
+
+    async def onReaction(self, reaction, user) -> None:
+        """
+        Turn a page if a reaction was added to a tracked message by the user it belongs to
+        Parameters:
+            reaction - the reaction that was added
+
+            user - who added it
+        """
+        paginator = self.active.get(reaction.message.id)
+        if paginator == None or user != paginator.author:
+            return
+
+        self.active.move_to_end(reaction.message.id)
+        await paginator.turn(str(reaction.emoji))
+        self.expire()
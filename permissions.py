@@ -1,5 +1,820 @@
 import discord
+import atexit
 import json
+import os
+import sqlite3
+import tempfile
+import threading
+
+DEFAULT = "default" # the permission every user has
+ADMIN = "admin" # the permission that grants every other permission
+ALL = -1 # the mask of a user with every permission, with every bit set
+
+
+class PermissionBits:
+    def __init__(self) -> None:
+        """
+        Assigns every permission a bit, so a set of permissions can be held as a single integer mask
+        and checking for a permission is one AND.
+
+        Bits are handed out in the order permissions are first seen and never change, so masks and the bits
+        commands store stay valid when the catalogue is reloaded. DEFAULT always has the first bit, and is in every mask.
+        """
+        self.lock = threading.Lock()
+        self.bits = {DEFAULT: 1}
+
+
+    def bit(self, permission: str) -> int:
+        """
+        Returns the bit for a permission, assigning the next free one if it doesn't have one yet
+        """
+        bit = self.bits.get(permission)
+        if bit == None:
+            with self.lock:
+                bit = self.bits.get(permission)
+                if bit == None:
+                    bit = self.bits[permission] = 1 << len(self.bits)
+        return bit
+
+
+    def compile(self, permissions) -> int:
+        """
+        Returns the mask for a collection of permissions, which always includes DEFAULT. A mask including ADMIN is ALL
+        """
+        mask = 1
+        for permission in permissions:
+            mask |= self.bit(permission)
+
+        if mask & self.bit(ADMIN):
+            return ALL
+        return mask
+
+
+
+class PermissionBackend:
+    def __init__(self, maxCachedMasks: int = 100000) -> None:
+        """
+        Storage for permission grants. Subclasses implement the lookups and changes below.
+
+        Permissions can be granted to users, to roles, and to guilds, where a guild grant applies to everybody in it.
+        A user's effective permissions, across all three, are resolved to a mask with getPermissionMask and cached until
+        the grants change.
+
+        Parameters:
+            maxCachedMasks - the most resolved masks kept at once
+        """
+        self.bits = PermissionBits()
+        self.maxCachedMasks = maxCachedMasks
+        self.masks = {} # (userID, roleIDs, guildID) -> mask
+
+
+    def getPermissionMask(self, userID: str, roleIDs: tuple[str] = (), guildID: str = None) -> int:
+        """
+        Returns the mask of everything a user is allowed, from their own grants, their roles' and their guild's
+
+        Parameters:
+            userID - the user's discord ID, as a string
+
+            roleIDs - the IDs of the user's roles, as strings
+
+            guildID - the ID of the guild the user is acting in, as a string, or None outside of a guild
+        """
+        self.refresh()
+        key = (userID, roleIDs, guildID)
+        mask = self.masks.get(key)
+        if mask == None:
+            mask = self.bits.compile(self.getGrantedPermissions(userID, roleIDs, guildID))
+            if len(self.masks) >= self.maxCachedMasks: # Clearing is cheaper than tracking recency, and the masks are quick to rebuild
+                self.masks = {}
+            self.masks[key] = mask
+        return mask
+
+
+    def getGrantedPermissions(self, userID: str, roleIDs: tuple[str] = (), guildID: str = None):
+        """
+        Returns every permission granted to a user, their roles or their guild. See getPermissionMask
+        """
+        raise NotImplementedError
+
+
+    def refresh(self) -> None:
+        """
+        Pick up changes made to the stored grants by anything else, discarding cached masks if there were any
+        """
+        pass
+
+
+    def getUserPermissions(self, userID: str) -> frozenset[str]:
+        """
+        Returns the set of permissions a user has been granted
+
+        Parameters:
+            userID - the user's discord ID, as a string
+        """
+        raise NotImplementedError
+
+
+    def getPermissionNames(self) -> dict[str, dict[str, str]]:
+        """
+        Returns the full permission dictionary
+        """
+        raise NotImplementedError
+
+
+    def addUserPermission(self, userID: str, permission: str) -> None:
+        """
+        Grant a permission to a user.
+
+        Parameters:
+            userID - the user's discord ID, as a string
+
+            permission - the permission
+        """
+        raise NotImplementedError
+
+
+    def removeUserPermission(self, userID: str, permission: str) -> None:
+        """
+        Revoke a permission from the user
+
+        Parameters:
+            userID - the user's discord ID, as a string
+
+            permission - the permission
+        """
+        raise NotImplementedError
+
+
+    def addUserPermissions(self, grants: list[tuple[str, str]]) -> None:
+        """
+        Grant many permissions at once
+
+        Parameters:
+            grants - (userID, permission) pairs
+        """
+        for userID, permission in grants:
+            self.addUserPermission(userID, permission)
+
+
+    def addRolePermission(self, roleID: str, permission: str) -> None:
+        """
+        Grant a permission to everybody with a role
+
+        Parameters:
+            roleID - the role's discord ID, as a string
+
+            permission - the permission
+        """
+        raise NotImplementedError
+
+
+    def removeRolePermission(self, roleID: str, permission: str) -> None:
+        """
+        Revoke a permission from a role
+
+        Parameters:
+            roleID - the role's discord ID, as a string
+
+            permission - the permission
+        """
+        raise NotImplementedError
+
+
+    def addGuildPermission(self, guildID: str, permission: str) -> None:
+        """
+        Grant a permission to everybody in a guild
+
+        Parameters:
+            guildID - the guild's discord ID, as a string
+
+            permission - the permission
+        """
+        raise NotImplementedError
+
+
+    def removeGuildPermission(self, guildID: str, permission: str) -> None:
+        """
+        Revoke a permission from a guild
+
+        Parameters:
+            guildID - the guild's discord ID, as a string
+
+            permission - the permission
+        """
+        raise NotImplementedError
+
+
+    def invalidate(self) -> None:
+        """
+        Discard anything cached, so the next lookup sees the stored state
+        """
+        self.masks = {}
+
+
+    def flush(self) -> None:
+        """
+        Persist any pending changes
+        """
+        pass
+
+
+
+class PermissionStore(PermissionBackend):
+    def __init__(self, permissionsPath: str) -> None:
+        """
+        A permission backend holding an in-memory copy of a permissions file.
+
+        Besides "permissions" and "users", the file may have "roles" and "guilds" sections, mapping role and guild IDs
+        to the permissions granted to them in the same way "users" does.
+
+        The file is parsed once and lookups are answered from memory. It is only read again when its inode,
+        modification time or size changes on disk, or after invalidate() is called.
+
+        Grants and revocations are written straight away unless write-behind is enabled, see enableWriteBehind().
+
+        Parameters:
+            permissionsPath - the path to the file containing permissions
+        """
+        super().__init__()
+        self.permissionsPath = permissionsPath
+        self.lock = threading.RLock()
+        self.fileSignature = None
+        self.document = {"permissions": {}, "users": {}, "roles": {}, "guilds": {}}
+        self.userPermissions = {}
+        self.writeBehind = False
+        self.flushInterval = None
+        self.flushThreshold = None
+        self.pendingChanges = 0
+        self.flushTimer = None
+
+
+    def enableWriteBehind(self, flushInterval: float = 5.0, flushThreshold: int = 100) -> None:
+        """
+        Batch grants and revocations instead of rewriting the file for every change.
+
+        Changes apply to the in-memory permissions immediately, and are written to disk in one go once flushThreshold
+        changes are pending or flushInterval seconds have passed since the first unwritten change, whichever comes first.
+        While changes are pending the in-memory permissions are authoritative, and edits made to the file by other programs
+        in that window will be overwritten.
+
+        Parameters:
+            flushInterval - the longest a change may wait before being written, in seconds. None to only flush on the threshold
+
+            flushThreshold - the number of pending changes that triggers an immediate write
+        """
+        with self.lock:
+            if not self.writeBehind:
+                atexit.register(self.flush)
+
+            self.writeBehind = True
+            self.flushInterval = flushInterval
+            self.flushThreshold = flushThreshold
+
+
+    def invalidate(self) -> None:
+        """
+        Force the permissions file to be read again on the next lookup
+        """
+        with self.lock:
+            self.fileSignature = None
+            self.masks = {}
+
+
+    def getFileSignature(self) -> tuple:
+        stat = os.stat(self.permissionsPath)
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+    def refresh(self) -> None:
+        """
+        Reload the permissions file if it has changed since it was last read
+        """
+        if self.pendingChanges > 0: # Unwritten changes take precedence over the file
+            return
+
+        signature = self.getFileSignature()
+        if signature == self.fileSignature:
+            return
+
+        with self.lock:
+            with open(self.permissionsPath, "r") as f:
+                perms = json.load(f)
+
+            perms.setdefault("roles", {})
+            perms.setdefault("guilds", {})
+            for permission in perms["permissions"]:
+                self.bits.bit(permission)
+
+            self.document = perms
+            self.userPermissions = {userID: frozenset(userPerms) for userID, userPerms in perms["users"].items()}
+            self.masks = {}
+            self.fileSignature = signature
+
+
+    def write(self) -> None:
+        """
+        Atomically replace the permissions file with the in-memory permissions.
+
+        The new contents are written to a temporary file in the same directory and renamed over the original,
+        so readers only ever see the old file or the complete new one.
+        """
+        with self.lock:
+            directory = os.path.dirname(os.path.abspath(self.permissionsPath))
+            fd, tempPath = tempfile.mkstemp(dir=directory, prefix=".permissions-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(self.document, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                if os.path.exists(self.permissionsPath):
+                    os.chmod(tempPath, os.stat(self.permissionsPath).st_mode & 0o777)
+
+                os.replace(tempPath, self.permissionsPath)
+            except:
+                if os.path.exists(tempPath):
+                    os.remove(tempPath)
+                raise
+
+            self.fileSignature = self.getFileSignature()
+
+
+    def flush(self) -> None:
+        """
+        Write any pending changes to disk. Should be called before shutting down when write-behind is enabled.
+        """
+        with self.lock:
+            if self.flushTimer != None:
+                self.flushTimer.cancel()
+                self.flushTimer = None
+
+            if self.pendingChanges == 0:
+                return
+
+            self.write()
+            self.pendingChanges = 0
+
+
+    def changed(self) -> None:
+        """
+        Record a change to the in-memory permissions, writing it out now or scheduling it according to the write mode
+        """
+        with self.lock:
+            self.masks = {}
+            self.pendingChanges += 1
+
+            if not self.writeBehind or self.pendingChanges >= self.flushThreshold:
+                self.flush()
+
+            elif self.flushTimer == None and self.flushInterval != None:
+                self.flushTimer = threading.Timer(self.flushInterval, self.flush)
+                self.flushTimer.daemon = True
+                self.flushTimer.start()
+
+
+    def getUserPermissions(self, userID: str) -> frozenset[str]:
+        """
+        Returns the set of permissions a user has been granted
+
+        Parameters:
+            userID - the user's discord ID, as a string
+        """
+        self.refresh()
+        return self.userPermissions.get(userID, frozenset())
+
+
+    def getGrantedPermissions(self, userID: str, roleIDs: tuple[str] = (), guildID: str = None) -> set[str]:
+        """
+        Returns every permission granted to a user, their roles or their guild
+        """
+        self.refresh()
+        document = self.document
+        granted = set(self.userPermissions.get(userID, ()))
+        for roleID in roleIDs:
+            granted.update(document["roles"].get(roleID, ()))
+        if guildID != None:
+            granted.update(document["guilds"].get(guildID, ()))
+        return granted
+
+
+    def getPermissionNames(self) -> dict[str, dict[str, str]]:
+        """
+        Returns the full permission dictionary
+        """
+        self.refresh()
+        return self.document["permissions"]
+
+
+    def addGrant(self, section: str, entityID: str, permission: str) -> None:
+        with self.lock:
+            self.refresh()
+            grants = self.document[section]
+            if not entityID in grants.keys():
+                grants[entityID] = []
+
+            if permission in grants[entityID]:
+                return
+
+            grants[entityID].append(permission)
+            self.changed()
+
+
+    def removeGrant(self, section: str, entityID: str, permission: str) -> None:
+        with self.lock:
+            self.refresh()
+            grants = self.document[section]
+            if not entityID in grants.keys():
+                return
+
+            grants[entityID].remove(permission)
+            self.changed()
+
+
+    def addRolePermission(self, roleID: str, permission: str) -> None:
+        """
+        Grant a permission to everybody with a role
+
+        Parameters:
+            roleID - the role's discord ID, as a string
+
+            permission - the permission
+        """
+        self.addGrant("roles", roleID, permission)
+
+
+    def removeRolePermission(self, roleID: str, permission: str) -> None:
+        """
+        Revoke a permission from a role
+
+        Parameters:
+            roleID - the role's discord ID, as a string
+
+            permission - the permission
+        """
+        self.removeGrant("roles", roleID, permission)
+
+
+    def addGuildPermission(self, guildID: str, permission: str) -> None:
+        """
+        Grant a permission to everybody in a guild
+
+        Parameters:
+            guildID - the guild's discord ID, as a string
+
+            permission - the permission
+        """
+        self.addGrant("guilds", guildID, permission)
+
+
+    def removeGuildPermission(self, guildID: str, permission: str) -> None:
+        """
+        Revoke a permission from a guild
+
+        Parameters:
+            guildID - the guild's discord ID, as a string
+
+            permission - the permission
+        """
+        self.removeGrant("guilds", guildID, permission)
+
+
+    def addUserPermission(self, userID: str, permission: str) -> None:
+        """
+        Grant a permission to a user.
+
+        Does not check existence of permission before writing.
+
+        Parameters:
+            userID - the user's discord ID, as a string
+
+            permission - the permission
+        """
+        with self.lock:
+            self.refresh()
+            users = self.document["users"]
+            if not userID in users.keys():
+                users[userID] = []
+
+            if permission in users[userID]:
+                return
+
+            users[userID].append(permission)
+            self.userPermissions[userID] = frozenset(users[userID])
+            self.changed()
+
+
+    def removeUserPermission(self, userID: str, permission: str) -> None:
+        """
+        Revoke a permission from the user
+
+        Does not check existence of permission before writing.
+
+        Parameters:
+            userID - the user's discord ID, as a string
+
+            permission - the permission
+        """
+        with self.lock:
+            self.refresh()
+            users = self.document["users"]
+            if not userID in users.keys():
+                return
+
+            users[userID].remove(permission)
+            self.userPermissions[userID] = frozenset(users[userID])
+            self.changed()
+
+
+    def addUserPermissions(self, grants: list[tuple[str, str]]) -> None:
+        """
+        Grant many permissions at once, with a single write
+
+        Parameters:
+            grants - (userID, permission) pairs
+        """
+        with self.lock:
+            self.refresh()
+            users = self.document["users"]
+            changedUsers = set()
+            for userID, permission in grants:
+                if not userID in users.keys():
+                    users[userID] = []
+
+                if not permission in users[userID]:
+                    users[userID].append(permission)
+                    changedUsers.add(userID)
+
+            if len(changedUsers) == 0:
+                return
+
+            for userID in changedUsers:
+                self.userPermissions[userID] = frozenset(users[userID])
+
+            self.changed()
+
+
+
+class SQLitePermissionBackend(PermissionBackend):
+    def __init__(self, databasePath: str) -> None:
+        """
+        A permission backend stored in an SQLite database.
+
+        Grants are indexed by user, role and guild, so resolving a user's permissions is a single indexed query no matter
+        how many grants there are. Resolved masks are cached until the database changes, which is noticed through
+        PRAGMA data_version even when the change was made by another connection.
+
+        Parameters:
+            databasePath - the path to the database file, which is created if it doesn't exist
+        """
+        super().__init__()
+        self.databasePath = databasePath
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(databasePath, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS permissions (name TEXT PRIMARY KEY, details TEXT NOT NULL)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS userPermissions (userID TEXT NOT NULL, permission TEXT NOT NULL, PRIMARY KEY (userID, permission)) WITHOUT ROWID")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS rolePermissions (roleID TEXT NOT NULL, permission TEXT NOT NULL, PRIMARY KEY (roleID, permission)) WITHOUT ROWID")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS guildPermissions (guildID TEXT NOT NULL, permission TEXT NOT NULL, PRIMARY KEY (guildID, permission)) WITHOUT ROWID")
+
+        self.dataVersion = None
+        for permission in self.getPermissionNames():
+            self.bits.bit(permission)
+
+
+    def refresh(self) -> None:
+        """
+        Discard cached masks if another connection has changed the database since the last lookup
+        """
+        with self.lock:
+            dataVersion = self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+        if dataVersion != self.dataVersion:
+            self.masks = {}
+            self.dataVersion = dataVersion
+
+
+    def getGrantedPermissions(self, userID: str, roleIDs: tuple[str] = (), guildID: str = None) -> set[str]:
+        """
+        Returns every permission granted to a user, their roles or their guild
+        """
+        query = "SELECT permission FROM userPermissions WHERE userID = ?"
+        parameters = [userID]
+        if len(roleIDs) > 0:
+            query += f" UNION SELECT permission FROM rolePermissions WHERE roleID IN ({', '.join('?' * len(roleIDs))})"
+            parameters.extend(roleIDs)
+        if guildID != None:
+            query += " UNION SELECT permission FROM guildPermissions WHERE guildID = ?"
+            parameters.append(guildID)
+
+        with self.lock:
+            rows = self.connection.execute(query, parameters).fetchall()
+
+        return {row[0] for row in rows}
+
+
+    def getUserPermissions(self, userID: str) -> frozenset[str]:
+        """
+        Returns the set of permissions a user has been granted
+
+        Parameters:
+            userID - the user's discord ID, as a string
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT permission FROM userPermissions WHERE userID = ?", (userID,)).fetchall()
+
+        return frozenset(row[0] for row in rows)
+
+
+    def getPermissionNames(self) -> dict[str, dict[str, str]]:
+        """
+        Returns the full permission dictionary
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT name, details FROM permissions").fetchall()
+
+        return {name: json.loads(details) for name, details in rows}
+
+
+    def addPermission(self, name: str, details: dict[str, str]) -> None:
+        """
+        Add a permission to the catalogue, or replace its details if it already exists
+
+        Parameters:
+            name - the permission
+
+            details - the permission's entry, as it would appear in a permissions file
+        """
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO permissions (name, details) VALUES (?, ?)", (name, json.dumps(details)))
+        self.bits.bit(name)
+
+
+    def addUserPermission(self, userID: str, permission: str) -> None:
+        """
+        Grant a permission to a user.
+
+        Does not check existence of permission before writing.
+
+        Parameters:
+            userID - the user's discord ID, as a string
+
+            permission - the permission
+        """
+        self.addUserPermissions([(userID, permission)])
+
+
+    def removeUserPermission(self, userID: str, permission: str) -> None:
+        """
+        Revoke a permission from the user
+
+        Parameters:
+            userID - the user's discord ID, as a string
+
+            permission - the permission
+        """
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM userPermissions WHERE userID = ? AND permission = ?", (userID, permission))
+        self.masks = {}
+
+
+    def addUserPermissions(self, grants: list[tuple[str, str]]) -> None:
+        """
+        Grant many permissions at once, in a single transaction
+
+        Parameters:
+            grants - (userID, permission) pairs
+        """
+        with self.lock, self.connection:
+            self.connection.executemany("INSERT OR IGNORE INTO userPermissions (userID, permission) VALUES (?, ?)", grants)
+        self.masks = {}
+
+
+    def addRolePermission(self, roleID: str, permission: str) -> None:
+        """
+        Grant a permission to everybody with a role
+
+        Parameters:
+            roleID - the role's discord ID, as a string
+
+            permission - the permission
+        """
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR IGNORE INTO rolePermissions (roleID, permission) VALUES (?, ?)", (roleID, permission))
+        self.masks = {}
+
+
+    def removeRolePermission(self, roleID: str, permission: str) -> None:
+        """
+        Revoke a permission from a role
+
+        Parameters:
+            roleID - the role's discord ID, as a string
+
+            permission - the permission
+        """
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM rolePermissions WHERE roleID = ? AND permission = ?", (roleID, permission))
+        self.masks = {}
+
+
+    def addGuildPermission(self, guildID: str, permission: str) -> None:
+        """
+        Grant a permission to everybody in a guild
+
+        Parameters:
+            guildID - the guild's discord ID, as a string
+
+            permission - the permission
+        """
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR IGNORE INTO guildPermissions (guildID, permission) VALUES (?, ?)", (guildID, permission))
+        self.masks = {}
+
+
+    def removeGuildPermission(self, guildID: str, permission: str) -> None:
+        """
+        Revoke a permission from a guild
+
+        Parameters:
+            guildID - the guild's discord ID, as a string
+
+            permission - the permission
+        """
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM guildPermissions WHERE guildID = ? AND permission = ?", (guildID, permission))
+        self.masks = {}
+
+
+    def close(self) -> None:
+        """
+        Close the database connection
+        """
+        with self.lock:
+            self.connection.close()
+
+
+
+def migrateJSONToSQLite(permissionsPath: str, databasePath: str) -> SQLitePermissionBackend:
+    """
+    Copy every permission and grant from a permissions file into an SQLite database.
+
+    Existing rows are kept, so running the migration again is harmless.
+
+    Parameters:
+        permissionsPath - the path to the file containing permissions
+
+        databasePath - the path to the database to fill
+
+    Returns:
+        The SQLite backend for the migrated database
+    """
+    with open(permissionsPath, "r") as f:
+        perms = json.load(f)
+
+    backend = SQLitePermissionBackend(databasePath)
+    with backend.lock, backend.connection:
+        backend.connection.executemany(
+            "INSERT OR IGNORE INTO permissions (name, details) VALUES (?, ?)",
+            [(name, json.dumps(details)) for name, details in perms["permissions"].items()]
+        )
+        backend.connection.executemany(
+            "INSERT OR IGNORE INTO userPermissions (userID, permission) VALUES (?, ?)",
+            [(userID, permission) for userID, userPerms in perms["users"].items() for permission in userPerms]
+        )
+        backend.connection.executemany(
+            "INSERT OR IGNORE INTO rolePermissions (roleID, permission) VALUES (?, ?)",
+            [(roleID, permission) for roleID, rolePerms in perms.get("roles", {}).items() for permission in rolePerms]
+        )
+        backend.connection.executemany(
+            "INSERT OR IGNORE INTO guildPermissions (guildID, permission) VALUES (?, ?)",
+            [(guildID, permission) for guildID, guildPerms in perms.get("guilds", {}).items() for permission in guildPerms]
+        )
+
+    for permission in perms["permissions"]:
+        backend.bits.bit(permission)
+
+    return backend
+
+
+
+stores = {}
+storesLock = threading.Lock()
+
+def getStore(permissionsPath: str) -> PermissionStore:
+    """
+    Returns the shared PermissionStore for a permissions file, creating it if necessary
+
+    Parameters:
+        permissionsPath - the path to the file containing permissions
+    """
+    key = os.path.abspath(permissionsPath)
+    with storesLock:
+        if not key in stores:
+            stores[key] = PermissionStore(permissionsPath)
+
+        return stores[key]
+
 
 def getUserPermissions(userID: str, permissionsPath: str) -> list[str]:
     """
@@ -10,13 +825,7 @@ def getUserPermissions(userID: str, permissionsPath: str) -> list[str]:
 
         permissionPath - the path to the file containing permissions
     """
-    with open(permissionsPath, "r") as f:
-        perms = json.load(f)
-
-    if not userID in perms["users"]: # For users who aren't in the permissions file
-        return []
-    
-    return perms["users"][userID]
+    return list(getStore(permissionsPath).getUserPermissions(userID))
 
 
 def getPermissionList(permissionsPath: str) -> list[str]:
@@ -26,11 +835,7 @@ def getPermissionList(permissionsPath: str) -> list[str]:
     Parameters:
         permissionPath - the path to the file containing permissions
     """
-
-    with open(permissionsPath, "r") as f:
-        perms = json.load(f)
-
-    return perms["permissions"].keys()
+    return getStore(permissionsPath).getPermissionNames().keys()
 
 
 def addUserPermission(userID: str, permission: str, permissionsPath: str):
@@ -46,18 +851,7 @@ def addUserPermission(userID: str, permission: str, permissionsPath: str):
 
         permissionPath - the path to the file containing permissions
     """
-
-    with open(permissionsPath, "r") as f:
-        perms = json.load(f)
-
-    if not userID in perms["users"].keys():
-        perms["users"][userID] = []
-
-    if not permission in perms["users"][userID]:
-        perms["users"][userID].append(permission)
-
-        with open(permissionsPath, "w") as f:
-            json.dump(perms, f)
+    getStore(permissionsPath).addUserPermission(userID, permission)
 
 def removeUserPermission(userID: str, permission: str, permissionsPath: str):
     """
@@ -72,17 +866,7 @@ def removeUserPermission(userID: str, permission: str, permissionsPath: str):
 
         permissionsPath - the path to the file containing permissions
     """
-
-    with open(permissionsPath, "r") as f:
-        perms = json.load(f)
-
-    if not userID in perms["users"].keys():
-        return
-
-    perms["users"][userID].remove(permission)
-
-    with open(permissionsPath, "w") as f:
-        json.dump(perms, f)
+    getStore(permissionsPath).removeUserPermission(userID, permission)
 
 
 def getPermissionNames(permissionsPath: str) -> dict[str, dict[str, str]]:
@@ -94,10 +878,6 @@ def getPermissionNames(permissionsPath: str) -> dict[str, dict[str, str]]:
 
     Returns:
         The full permissions dictionary
-    
-    """
-    
-    with open(permissionsPath, "r") as f:
-        perms = json.load(f)
 
-    return perms["permissions"]
\ No newline at end of file
+    """
+    return getStore(permissionsPath).getPermissionNames()
\ No newline at end of file
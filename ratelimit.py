@@ -0,0 +1,85 @@
+import collections
+import time
+
+class RateLimit:
+    def __init__(self, capacity: float, refillRate: float) -> None:
+        """
+        A token bucket configuration. Each use takes a token, and tokens come back at a steady rate up to the capacity
+        Parameters:
+            capacity - the most uses allowed in a burst
+
+            refillRate - how many tokens come back per second
+        """
+        self.capacity = capacity
+        self.refillRate = refillRate
+
+
+    @staticmethod
+    def cooldown(seconds: float) -> "RateLimit":
+        """
+        Returns a RateLimit allowing one use every given number of seconds
+        Parameters:
+            seconds - the cooldown between uses
+        """
+        return RateLimit(1, 1/seconds)
+
+
+
+class RateLimiter:
+    def __init__(self, limit: RateLimit, maxBuckets: int = 100000, clock = time.monotonic) -> None:
+        """
+        Token buckets for many keys, such as user IDs, held in memory.
+
+        A bucket that has refilled completely behaves exactly like one that doesn't exist, so idle buckets are discarded
+        as they are found. If more than maxBuckets are still active, the least recently used are discarded, which at worst
+        lets those keys start again with a full bucket.
+
+        Parameters:
+            limit - the RateLimit every bucket follows
+
+            maxBuckets - the most buckets kept at once
+
+            clock - a function returning the current time in seconds
+        """
+        self.limit = limit
+        self.maxBuckets = maxBuckets
+        self.clock = clock
+        self.buckets = collections.OrderedDict() # key -> [tokens, time last updated], least recently used first
+
+
+    def acquire(self, key) -> float:
+        """
+        Take a token from a key's bucket, if one is available
+        Parameters:
+            key - whose bucket to take from
+        Returns:
+            retryAfter - 0 if the token was taken, otherwise the number of seconds until one will be available
+        """
+        now = self.clock()
+        bucket = self.buckets.get(key)
+        if bucket == None:
+            tokens = self.limit.capacity
+        else:
+            tokens = min(self.limit.capacity, bucket[0] + (now - bucket[1]) * self.limit.refillRate)
+            self.buckets.move_to_end(key)
+
+        if tokens < 1:
+            self.buckets[key] = [tokens, now]
+            return (1 - tokens) / self.limit.refillRate
+
+        self.buckets[key] = [tokens - 1, now]
+        self.evict(now)
+        return 0
+
+
+    def evict(self, now: float) -> None:
+        """
+        Discard idle buckets from the least recently used end, and the oldest buckets beyond maxBuckets
+        Parameters:
+            now - the current time
+        """
+        while len(self.buckets) > 0:
+            key, (tokens, updated) = next(iter(self.buckets.items()))
+            if len(self.buckets) <= self.maxBuckets and tokens + (now - updated) * self.limit.refillRate < self.limit.capacity:
+                break
+            del self.buckets[key]
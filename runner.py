@@ -0,0 +1,327 @@
+import cobble.bot
+import cobble.cli
+import cobble.dispatcher
+import cobble.fakegateway
+import cobble.permissions
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import queue
+import sys
+import time
+import discord
+
+logger = logging.getLogger(__name__)
+
+
+def assignShards(shardCount: int, workers: int) -> list[list[int]]:
+    """
+    Split shard IDs between workers as evenly as possible
+    Returns:
+        The shard IDs each worker handles, one list per worker
+    """
+    return [list(range(worker, shardCount, workers)) for worker in range(workers)]
+
+
+def shardFor(guildID: int, shardCount: int) -> int:
+    """
+    Returns the shard discord delivers a guild's events on. Direct messages always arrive on shard 0
+    """
+    if guildID == None:
+        return 0
+    return (int(guildID) >> 22) % shardCount
+
+
+def loadWorkerBot(definition: str, permissionsDatabase: str) -> "cobble.bot.Bot":
+    bot = cobble.cli.loadBot(definition)
+    if permissionsDatabase != None:
+        bot.setPermissionBackend(cobble.permissions.SQLitePermissionBackend(permissionsDatabase))
+    return bot
+
+
+def runWorker(definition: str, shardIDs: list[int], shardCount: int, permissionsDatabase: str = None, dispatcherOptions: dict = None) -> None:
+    """
+    Run one worker process, connecting to discord as the given shards
+    Parameters:
+        definition - the bot to load, see cobble.cli.loadBot
+
+        shardIDs - the shards this worker handles
+
+        shardCount - the total number of shards across every worker
+
+        permissionsDatabase - the SQLite database the workers share permissions through, or None to keep the bot's own backend
+
+        dispatcherOptions - passed on to the worker's Dispatcher
+    """
+    bot = loadWorkerBot(definition, permissionsDatabase)
+
+    intents = discord.Intents.default()
+    intents.message_content = True
+    client = discord.AutoShardedClient(intents=intents, shard_ids=shardIDs, shard_count=shardCount)
+
+    dispatcher = cobble.dispatcher.Dispatcher(bot, **(dispatcherOptions or {}))
+    dispatcher.attach(client)
+
+    try:
+        client.run(bot.token)
+    finally:
+        bot.permissions.flush()
+        bot.executor.shutdown()
+
+
+def runFakeWorker(definition: str, shardIDs: list[int], shardCount: int, permissionsDatabase: str = None, dispatcherOptions: dict = None, eventsPath: str = None, rate: float = None, results: multiprocessing.Queue = None) -> dict:
+    """
+    Run one worker against a fake gateway instead of discord, replaying only the events that belong to its shards
+    Parameters:
+        definition, shardIDs, shardCount, permissionsDatabase, dispatcherOptions - as for runWorker
+
+        eventsPath - a JSONL file of events, see cobble.fakegateway.FakeGateway.makeMessage
+
+        rate - the most messages delivered per second, or None for as fast as possible
+
+        results - a queue the worker's report is put on
+    Returns:
+        The fake gateway's report, with the worker's shard IDs
+    """
+    bot = loadWorkerBot(definition, permissionsDatabase)
+    shards = set(shardIDs)
+    events = [event for event in cobble.fakegateway.loadJSONL(eventsPath) if shardFor(event.get("guild"), shardCount) in shards]
+
+    async def replay():
+        gateway = cobble.fakegateway.FakeGateway()
+        dispatcher = cobble.dispatcher.Dispatcher(bot, **(dispatcherOptions or {}))
+        dispatcher.attach(gateway.client)
+        await gateway.replay(events, rate)
+        await dispatcher.join()
+        await dispatcher.stop()
+        return gateway.report()
+
+    try:
+        report = asyncio.run(replay())
+    finally:
+        bot.permissions.flush()
+        bot.executor.shutdown()
+
+    report["shards"] = shardIDs
+    if results != None:
+        results.put(report)
+    return report
+
+
+
+class ShardedRunner:
+    def __init__(self, definition: str, shardCount: int, workers: int = None, permissionsDatabase: str = None, dispatcherOptions: dict = None, restart: bool = True, maxRestarts: int = 5, restartBackoff: float = 1.0, maxRestartBackoff: float = 60.0, stableAfter: float = 300.0) -> None:
+        """
+        Runs a bot across several processes, each connecting to discord as a subset of its shards, so it can use more than one core.
+
+        Every worker loads the same bot definition, so they all have the same commands. Caches stay local to each worker.
+        Permissions are shared through an SQLite database, which every worker reads and writes. Each worker notices changes
+        made by the others through PRAGMA data_version and drops its cached masks, so a grant made in one worker applies in all
+        of them on the next command.
+
+        Parameters:
+            definition - the bot to load in each worker, as module:attribute or path/to/file.py:attribute. It must be importable
+                         by a fresh process, since workers are spawned rather than forked
+
+            shardCount - the total number of shards
+
+            workers - the number of worker processes, defaults to the number of CPUs, and never more than shardCount
+
+            permissionsDatabase - the SQLite database to share permissions through, see cobble.permissions.migrateJSONToSQLite.
+                                  None leaves each worker with its bot's own backend, which is only safe if nothing writes to it
+
+            dispatcherOptions - passed on to each worker's Dispatcher, i.e. {"workers": 8}
+
+            restart - whether a worker that exits with an error is started again
+
+            maxRestarts - how many times in a row a worker may be restarted. Once a worker runs out, the runner stops every worker,
+                          since a worker that keeps failing, i.e. on a bad token, will never succeed
+
+            restartBackoff - how long to wait before restarting a worker the first time, in seconds. Each further restart in a row waits twice as long
+
+            maxRestartBackoff - the longest wait before a restart, in seconds
+
+            stableAfter - how long a restarted worker must run before its restarts stop counting as in a row, in seconds
+        """
+        if workers == None:
+            workers = multiprocessing.cpu_count()
+
+        self.definition = definition
+        self.shardCount = shardCount
+        self.workerCount = max(1, min(workers, shardCount))
+        self.permissionsDatabase = permissionsDatabase
+        self.dispatcherOptions = dispatcherOptions
+        self.restart = restart
+        self.maxRestarts = maxRestarts
+        self.restartBackoff = restartBackoff
+        self.maxRestartBackoff = maxRestartBackoff
+        self.stableAfter = stableAfter
+        self.context = multiprocessing.get_context("spawn")
+        self.assignments = assignShards(shardCount, self.workerCount)
+        self.processes = []
+        self.startedAt = [] # when each worker was last started, by time.monotonic()
+        self.restarts = [] # how many times in a row each worker has been restarted
+        self.restartAt = [] # when each crashed worker is due to be restarted, or None
+        self.stopping = False
+        self.failed = False
+
+
+    def startWorker(self, worker: int) -> multiprocessing.Process:
+        process = self.context.Process(
+            target=runWorker,
+            args=(self.definition, self.assignments[worker], self.shardCount, self.permissionsDatabase, self.dispatcherOptions),
+            name=f"cobble-worker-{worker}"
+        )
+        process.start()
+        self.startedAt[worker] = time.monotonic()
+        return process
+
+
+    def run(self, pollInterval: float = 1.0) -> None:
+        """
+        Start every worker and supervise them until they have all exited, one has failed too many times, or stop() is called
+        """
+        self.startedAt = [None] * self.workerCount
+        self.restarts = [0] * self.workerCount
+        self.restartAt = [None] * self.workerCount
+        self.processes = [self.startWorker(worker) for worker in range(self.workerCount)]
+        try:
+            while not self.stopping:
+                self.restartCrashed()
+                if self.failed:
+                    break
+                if not any(process.is_alive() for process in self.processes) and not any(self.restartAt):
+                    break
+                time.sleep(pollInterval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+    def restartCrashed(self) -> bool:
+        """
+        Start any worker again that exited with an error and has waited out its backoff, if restarting is enabled.
+        Sets failed if a worker has been restarted maxRestarts times in a row
+        Returns:
+            Whether any worker was restarted
+        """
+        if not self.restart or self.stopping:
+            return False
+
+        now = time.monotonic()
+        restarted = False
+        for worker, process in enumerate(self.processes):
+            if process.exitcode == None:
+                if self.restarts[worker] > 0 and now - self.startedAt[worker] >= self.stableAfter:
+                    self.restarts[worker] = 0
+                continue
+
+            if process.exitcode == 0:
+                continue
+
+            if self.restartAt[worker] == None:
+                if self.restarts[worker] >= self.maxRestarts:
+                    logger.error("Worker %s for shards %s exited with code %s after %s restarts in a row, giving up", worker, self.assignments[worker], process.exitcode, self.restarts[worker])
+                    self.failed = True
+                    return restarted
+
+                delay = min(self.restartBackoff * 2 ** self.restarts[worker], self.maxRestartBackoff)
+                self.restartAt[worker] = now + delay
+                logger.error("Worker %s for shards %s exited with code %s, restarting it in %.1f seconds", worker, self.assignments[worker], process.exitcode, delay)
+
+            if now >= self.restartAt[worker]:
+                self.restartAt[worker] = None
+                self.restarts[worker] += 1
+                self.processes[worker] = self.startWorker(worker)
+                restarted = True
+        return restarted
+
+
+    def stop(self, timeout: float = 10) -> None:
+        """
+        Stop every worker, waiting up to timeout seconds for each before killing it
+        """
+        self.stopping = True
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+
+    def runFake(self, eventsPath: str, rate: float = None) -> dict:
+        """
+        Run the workers against fake gateways instead of discord, each replaying the events for its shards, and wait for them to finish
+        Parameters:
+            eventsPath - a JSONL file of events, see cobble.fakegateway.FakeGateway.makeMessage. Events are sharded by their "guild"
+
+            rate - the most messages each worker receives per second, or None for as fast as possible
+        Returns:
+            A summary with every worker's report and the totals across them
+        """
+        results = self.context.Queue()
+        processes = []
+        for worker in range(self.workerCount):
+            process = self.context.Process(
+                target=runFakeWorker,
+                args=(self.definition, self.assignments[worker], self.shardCount, self.permissionsDatabase, self.dispatcherOptions, eventsPath, rate, results),
+                name=f"cobble-fake-worker-{worker}"
+            )
+            process.start()
+            processes.append(process)
+
+        # Reports are collected before joining, so a full queue can't keep a worker from exiting
+        reports = []
+        while len(reports) < len(processes):
+            try:
+                reports.append(results.get(timeout=1))
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes) and results.empty():
+                    logger.error("%s of %s workers exited without a report", len(processes) - len(reports), len(processes))
+                    break
+
+        for process in processes:
+            process.join()
+
+        reports.sort(key=lambda report: report["shards"])
+        return {
+            "workers": reports,
+            "received": sum(report["received"] for report in reports),
+            "sent": sum(report["sent"] for report in reports),
+            "answered": sum(report["answered"] for report in reports),
+            "rateLimited": sum(report["rateLimited"] for report in reports),
+            "throughput": sum(report["throughput"] for report in reports)
+        }
+
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run a cobble bot across several processes, each handling some of its shards")
+    parser.add_argument("bot", help="the bot to load, as module:attribute or path/to/file.py:attribute")
+    parser.add_argument("--shards", type=int, required=True, help="the total number of shards")
+    parser.add_argument("--workers", type=int, help="the number of worker processes, defaults to the number of CPUs")
+    parser.add_argument("--permissions-db", help="an SQLite database the workers share permissions through")
+    parser.add_argument("--fake", metavar="EVENTS", help="replay a JSONL file of events through fake gateways instead of connecting to discord, and print a report")
+    parser.add_argument("--rate", type=float, help="with --fake, the most messages each worker receives per second")
+    options = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    runner = ShardedRunner(options.bot, options.shards, options.workers, options.permissions_db)
+    if options.fake:
+        json.dump(runner.runFake(options.fake, options.rate), sys.stdout, indent=4)
+        sys.stdout.write("\n")
+        return 0
+
+    runner.run()
+    return 1 if runner.failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,164 @@
+import cobble.ratelimit
+import asyncio
+import collections
+import logging
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_LIMIT = 2000 # The most characters discord allows in one message
+
+
+def chunk(text: str, limit: int = MESSAGE_LIMIT) -> list[str]:
+    """
+    Split text into pieces that fit in a message, breaking on line boundaries where possible
+    Parameters:
+        text - the text to split
+
+        limit - the most characters in a piece
+    """
+    if len(text) <= limit:
+        return [text]
+
+    pieces = []
+    current = []
+    currentLength = 0
+    for line in text.split("\n"):
+        while len(line) > limit: # A single line too long to fit has to be broken
+            if len(current) > 0:
+                pieces.append("\n".join(current))
+                current = []
+                currentLength = 0
+            pieces.append(line[:limit])
+            line = line[limit:]
+
+        addedLength = len(line) + (1 if len(current) > 0 else 0)
+        if currentLength + addedLength > limit:
+            pieces.append("\n".join(current))
+            current = []
+            currentLength = 0
+            addedLength = len(line)
+
+        current.append(line)
+        currentLength += addedLength
+
+    if len(current) > 0:
+        pieces.append("\n".join(current))
+
+    return pieces
+
+
+
+class OutboundSender:
+    def __init__(self, channelRateLimit: cobble.ratelimit.RateLimit = None) -> None:
+        """
+        Sends responses in the background, so sending never holds up processing commands.
+
+        Each channel has its own queue, sent in order. Responses too long for one message are split on line boundaries,
+        and short responses waiting for the same channel are merged into as few messages as possible.
+
+        Sends to a channel are paced by a fixed RateLimit chosen to stay within discord's limit. discord.py handles 429 responses
+        and their rate limit headers itself, retrying internally, and doesn't expose its buckets, so they aren't read here.
+
+        Parameters:
+            channelRateLimit - the pace to keep per channel. Defaults to a burst of 3 then one message every 2.5 seconds,
+                               which never sends more than discord's 5 messages in any 5 seconds
+        """
+        if channelRateLimit == None:
+            channelRateLimit = cobble.ratelimit.RateLimit(3, 0.4)
+        self.pacer = cobble.ratelimit.RateLimiter(channelRateLimit)
+        self.queues = {} # channel ID -> deque of (channel, text)
+        self.workers = {} # channel ID -> task sending that channel's queue
+        self.sent = 0
+        self.dropped = 0
+
+
+    def send(self, channel, text) -> None:
+        """
+        Queue a response to be sent to a channel. Returns immediately
+        Parameters:
+            channel - the channel to send to
+
+            text - the response, either a string or a cobble.pagination.PagedResponse
+        """
+        if not text:
+            return
+
+        queue = self.queues.get(channel.id)
+        if queue == None:
+            queue = self.queues[channel.id] = collections.deque()
+        queue.append((channel, text))
+
+        if not channel.id in self.workers:
+            self.workers[channel.id] = asyncio.create_task(self.work(channel.id))
+
+
+    async def work(self, channelID) -> None:
+        queue = self.queues[channelID]
+        try:
+            while len(queue) > 0:
+                channel, text = queue.popleft()
+                if type(text) != str: # Paged responses send themselves, a page at a time
+                    try:
+                        await text.deliver(self, channel)
+                    except Exception:
+                        self.dropped += 1
+                        logger.exception("Failed to send a paged response to channel %s", channelID)
+                    continue
+
+                # Merge whatever else is already waiting, as long as it still fits in one message
+                merged = []
+                while len(queue) > 0 and type(queue[0][1]) == str and len(text) + 1 + len(queue[0][1]) <= MESSAGE_LIMIT:
+                    mergedChannel, mergedText = queue.popleft()
+                    text += "\n" + mergedText
+                    merged.append(mergedChannel)
+
+                for piece in chunk(text):
+                    try:
+                        message = await self.deliver(channel, piece)
+                        self.notifyMerged(merged, message)
+                    except Exception:
+                        self.dropped += 1
+                        logger.exception("Failed to send a message to channel %s", channelID)
+        finally:
+            del self.workers[channelID]
+            if len(queue) == 0:
+                del self.queues[channelID]
+
+
+    def notifyMerged(self, channels: list, message) -> None:
+        """
+        Tell the channels whose responses were merged into a message sent through another, if they want to know.
+        Channels opt in with a mergedInto(message) method, as the fake gateway's do to match responses to the messages they answer
+        """
+        for channel in channels:
+            mergedInto = getattr(channel, "mergedInto", None)
+            if mergedInto != None:
+                mergedInto(message)
+
+
+    async def deliver(self, channel, content: str):
+        """
+        Send one message once the channel's pace allows it
+        Returns:
+            message - the message that was sent
+        """
+        await self.waitForTurn(channel.id)
+        message = await channel.send(content)
+        self.sent += 1
+        return message
+
+
+    async def waitForTurn(self, channelID) -> None:
+        while True:
+            wait = self.pacer.acquire(channelID)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+
+    async def join(self) -> None:
+        """
+        Wait until every queued response has been sent
+        """
+        while len(self.workers) > 0:
+            await asyncio.gather(*self.workers.values(), return_exceptions=True)
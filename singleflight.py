@@ -0,0 +1,103 @@
+import asyncio
+import collections
+import time
+
+class SingleFlight:
+    def __init__(self) -> None:
+        """
+        Coalesces concurrent calls with the same key, so only the first one runs and the rest share its result
+        """
+        self.inFlight = {}
+
+
+    async def run(self, key, function):
+        """
+        Run a coroutine function, or wait for the result of an identical call that is already running
+        Parameters:
+            key - identifies identical calls, must be hashable
+
+            function - a function returning the coroutine to run, called only if no identical call is running
+        Returns:
+            result - the result of whichever call ran. Exceptions are shared in the same way, except cancellation:
+                     if the call is cancelled along with the caller that started it, the others run it again
+        """
+        future = self.inFlight.get(key)
+        while future != None:
+            try:
+                # Shielded so that one waiter being cancelled doesn't cancel the call for everyone else
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled(): # This waiter was cancelled itself
+                    raise
+            future = self.inFlight.get(key) # Another waiter may have started the call again already
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception()) # Nobody may be waiting to retrieve an exception
+        self.inFlight[key] = future
+        try:
+            result = await function()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self.inFlight[key]
+
+
+
+class ResultCache:
+    def __init__(self, ttl: float, maxSize: int = 128, clock = time.monotonic) -> None:
+        """
+        A small cache of recent results, each kept for a fixed time and evicted least recently used first when full
+        Parameters:
+            ttl - how long a result stays valid, in seconds
+
+            maxSize - the most results kept at once
+
+            clock - a function returning the current time in seconds
+        """
+        self.ttl = ttl
+        self.maxSize = maxSize
+        self.clock = clock
+        self.entries = collections.OrderedDict() # key -> (expiry time, result), least recently used first
+
+
+    def get(self, key) -> tuple[bool, object]:
+        """
+        Look up a result
+        Parameters:
+            key - the key the result was stored under
+        Returns:
+            found - whether an unexpired result exists
+
+            result - the result, or None if there isn't one
+        """
+        entry = self.entries.get(key)
+        if entry == None:
+            return False, None
+
+        if entry[0] <= self.clock():
+            del self.entries[key]
+            return False, None
+
+        self.entries.move_to_end(key)
+        return True, entry[1]
+
+
+    def put(self, key, result) -> None:
+        """
+        Store a result
+        Parameters:
+            key - the key to store the result under
+
+            result - the result
+        """
+        self.entries[key] = (self.clock() + self.ttl, result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
@@ -0,0 +1,242 @@
+import asyncio
+import collections
+import contextvars
+import cProfile
+import io
+import pstats
+import re
+import time
+
+# How slow invocations are profiled
+CPROFILE = "cProfile" # profile the whole execution with cProfile. Only one invocation is profiled at a time
+SAMPLE = "sample" # once an invocation passes the threshold, sample the chain of coroutines it is awaiting until it finishes
+
+MAX_LINE_LENGTH = 200 # The longest command line kept, in characters
+CONTROL_CHARACTERS = re.compile(r"[\x00-\x1f\x7f]")
+
+sampling = contextvars.ContextVar("sampling", default=None) # the Capture sampling the current execution, if any
+
+
+def sanitize(commandLine: str) -> str:
+    """
+    Make a command line safe to keep and show back to admins: control characters and newlines become spaces,
+    backticks can't break out of a code block, and it is cut to MAX_LINE_LENGTH characters
+    """
+    commandLine = CONTROL_CHARACTERS.sub(" ", commandLine).replace("`", "'")
+    if len(commandLine) > MAX_LINE_LENGTH:
+        commandLine = commandLine[:MAX_LINE_LENGTH - 1] + "…"
+    return commandLine
+
+
+def awaitStack(task: asyncio.Task) -> tuple[str]:
+    """
+    Returns where a task is suspended, as the chain of coroutines it is awaiting from outermost to innermost
+    """
+    frames = []
+    awaiting = task.get_coro()
+    while awaiting != None:
+        if isinstance(awaiting, asyncio.Task): # i.e. a task awaited directly
+            awaiting = awaiting.get_coro()
+
+        frame = getattr(awaiting, "cr_frame", None) or getattr(awaiting, "ag_frame", None) or getattr(awaiting, "gi_frame", None)
+        if frame != None:
+            frames.append(f"{frame.f_code.co_filename}:{frame.f_lineno} in {frame.f_code.co_name}")
+
+        awaiting = getattr(awaiting, "cr_await", None) or getattr(awaiting, "ag_await", None) or getattr(awaiting, "gi_yieldfrom", None)
+    return tuple(frames)
+
+
+def follow(task: asyncio.Task) -> None:
+    """
+    Have the execution being sampled, if any, also sample a task it is waiting on. Needed where the wait can't be followed
+    from the awaiting coroutine, such as asyncio.wait_for, which waits on a bare future until the task finishes
+    """
+    capture = sampling.get()
+    if capture != None:
+        capture.inner = task
+
+
+
+class Capture:
+    def __init__(self, log: "SlowCommandLog") -> None:
+        """
+        Profiles a single execution according to the log's profile mode. Used as a context manager around it
+        """
+        self.log = log
+        self.profiler = None
+        self.task = None
+        self.inner = None
+        self.token = None
+        self.timer = None
+        self.samples = collections.Counter()
+
+
+    def __enter__(self) -> "Capture":
+        if self.log.profile == CPROFILE and not self.log.profiling:
+            self.log.profiling = True
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+        elif self.log.profile == SAMPLE:
+            self.task = asyncio.current_task()
+            self.token = sampling.set(self)
+            self.timer = asyncio.get_running_loop().call_later(self.log.threshold, self.sample)
+
+        return self
+
+
+    def __exit__(self, *exception) -> None:
+        if self.profiler != None:
+            self.profiler.disable()
+            self.log.profiling = False
+
+        if self.token != None:
+            sampling.reset(self.token)
+            self.token = None
+
+        if self.timer != None:
+            self.timer.cancel()
+            self.timer = None
+
+
+    def sample(self) -> None:
+        stack = awaitStack(self.task)
+        if self.inner != None and not self.inner.done():
+            stack += awaitStack(self.inner)
+        self.samples[stack] += 1
+        self.timer = asyncio.get_running_loop().call_later(self.log.sampleInterval, self.sample)
+
+
+    def render(self) -> str:
+        """
+        Returns the profile as text, or None if nothing was captured
+        """
+        if self.profiler != None:
+            output = io.StringIO()
+            pstats.Stats(self.profiler, stream=output).sort_stats("cumulative").print_stats(self.log.profileLines)
+            return output.getvalue().strip()
+
+        if len(self.samples) > 0:
+            total = sum(self.samples.values())
+            lines = []
+            for stack, count in self.samples.most_common(3):
+                lines.append(f"{count}/{total} samples:")
+                lines.extend(f"  {frame}" for frame in stack[-self.log.profileLines:])
+            return "\n".join(lines)
+
+        return None
+
+
+
+class SlowCommand:
+    def __init__(self, number: int, recordedAt: float, command: str, commandLine: str, stages: dict[str, float], seconds: float, outcome: str, profile: str) -> None:
+        """
+        A record of one slow invocation
+        Parameters:
+            number - its position among every slow invocation recorded, starting at 1
+
+            recordedAt - when it finished, by time.time()
+
+            command - the name of the command
+
+            commandLine - the sanitized command line
+
+            stages - how long each stage took, in seconds
+
+            seconds - how long processing took in total
+
+            outcome - how processing ended, one of the outcome constants in cobble.metrics
+
+            profile - the profile captured, or None
+        """
+        self.number = number
+        self.recordedAt = recordedAt
+        self.command = command
+        self.commandLine = commandLine
+        self.stages = stages
+        self.seconds = seconds
+        self.outcome = outcome
+        self.profile = profile
+
+
+    def summary(self) -> str:
+        recordedAt = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.recordedAt))
+        return f"#{self.number} {recordedAt} {self.command} {self.seconds * 1000:.1f}ms {self.outcome}: `{self.commandLine}`"
+
+
+    def details(self) -> str:
+        lines = [self.summary()]
+        for stage, seconds in self.stages.items():
+            lines.append(f"{stage}: {seconds * 1000:.2f}ms")
+
+        if self.profile != None:
+            lines.append(f"```\n{self.profile}\n```")
+        return "\n".join(lines)
+
+
+
+class SlowCommandLog:
+    def __init__(self, threshold: float = 1.0, size: int = 50, profile: str = None, sampleInterval: float = 0.05, profileLines: int = 20) -> None:
+        """
+        Keeps the most recent invocations that took longer than a threshold, for admins to inspect with SlowCommandsCommand.
+
+        Every invocation is timed stage by stage while a log is attached to the bot. Only invocations over the threshold
+        are kept, in a ring buffer that drops the oldest once full.
+
+        Parameters:
+            threshold - how long an invocation must take to be recorded, in seconds
+
+            size - the most invocations kept
+
+            profile - how to profile executions, CPROFILE, SAMPLE or None to not profile.
+                      CPROFILE profiles every execution while no other is being profiled, and includes whatever else the
+                      event loop runs meanwhile, so it suits hunting one command rather than running all the time.
+                      SAMPLE costs nothing for invocations faster than the threshold, and shows where slow ones were waiting,
+                      but can't see into commands that block the event loop or run in the thread or process pools
+
+            sampleInterval - with SAMPLE, the time between samples, in seconds
+
+            profileLines - the most functions or frames shown in a profile
+        """
+        self.threshold = threshold
+        self.profile = profile
+        self.sampleInterval = sampleInterval
+        self.profileLines = profileLines
+        self.entries = collections.deque(maxlen=size)
+        self.recorded = 0
+        self.profiling = False
+
+
+    def capture(self) -> Capture:
+        return Capture(self)
+
+
+    def consider(self, trace, outcome: str, seconds: float) -> None:
+        """
+        Record an invocation if it was slow
+        Parameters:
+            trace - the invocation's cobble.metrics.Trace
+
+            outcome - how processing ended
+
+            seconds - how long processing took in total
+        """
+        if seconds < self.threshold:
+            return
+
+        profile = None
+        if trace.capture != None:
+            profile = trace.capture.render()
+
+        self.recorded += 1
+        self.entries.append(SlowCommand(self.recorded, time.time(), trace.command, sanitize(trace.commandLine or ""), dict(trace.stages), seconds, outcome, profile))
+
+
+    def get(self, number: int) -> SlowCommand:
+        """
+        Returns a recorded invocation by its number, or None if it isn't kept any more
+        """
+        for entry in self.entries:
+            if entry.number == number:
+                return entry
+        return None
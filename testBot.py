@@ -1,15 +1,16 @@
-import bot
-import command
-import permissions
+import cobble.bot
+import cobble.command
+import cobble.dispatcher
 import os
 import discord
 dirPath = os.path.dirname(os.path.realpath(__file__))
 
 
-testBot = bot.Bot(dirPath+"/config.json", "TestBot", ".")
+testBot = cobble.bot.Bot(dirPath+"/config.json", dirPath+"/permissions.json", "TestBot", ".")
 
 
-testBot.addCommand(command.HelpCommand(testBot))
+testBot.addCommand(cobble.command.HelpCommand(testBot))
+testBot.addCommand(cobble.command.ListCommand(testBot))
 
 
 intents = discord.Intents.default()
@@ -17,26 +18,13 @@ intents.message_content = True
 
 client = discord.Client(intents=intents)
 
+dispatcher = cobble.dispatcher.Dispatcher(testBot)
+dispatcher.attach(client)
+
 @client.event
 async def on_ready():
     print(f'We have logged in as {client.user}')
 
 
-@client.event
-async def on_message(message):
-    if message.author == client.user:
-        return
-    
-    if message.content[0] == testBot.prefix:
-        if message.author.id in testBot.admins:
-            permissionLevel = permissions.ADMIN
-        elif "Trusted" in [role.name for role in message.author.roles]:
-            permissionLevel = permissions.TRUSTED
-        else:
-            permissionLevel = permissions.EVERYONE
-
-        await message.channel.send(testBot.processCommand(message.content[1:], permissionLevel))
-
-
 
 client.run(testBot.token)
\ No newline at end of file
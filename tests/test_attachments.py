@@ -0,0 +1,104 @@
+import cobble.attachments
+import cobble.fakegateway
+import asyncio
+import io
+import pytest
+import tempfile
+
+
+DATA = b"name,score\n" + b"".join(f"player{index},{index}\n".encode() for index in range(1000))
+
+
+@pytest.mark.parametrize("delivery", [cobble.attachments.BYTES, cobble.attachments.SPOOLED, cobble.attachments.MMAP])
+def testFetchEachDelivery(delivery: str):
+    async def fetch():
+        attached = await cobble.attachments.fetch(cobble.fakegateway.FakeAttachment("scores.csv", DATA, "text/csv"), delivery)
+        try:
+            return attached.header, await attached.read()
+        finally:
+            attached.close()
+
+    header, content = asyncio.run(fetch())
+    assert header == DATA[:cobble.attachments.HEADER_SIZE]
+    assert content == DATA
+
+
+@pytest.mark.parametrize("delivery", [cobble.attachments.BYTES, cobble.attachments.SPOOLED, cobble.attachments.MMAP])
+def testFetchEmptyFile(delivery: str):
+    async def fetch():
+        attached = await cobble.attachments.fetch(cobble.fakegateway.FakeAttachment("empty.txt", b""), delivery)
+        try:
+            return await attached.read()
+        finally:
+            attached.close()
+
+    assert asyncio.run(fetch()) == b""
+
+
+def testFakeSaveOnlyWritesIntoBufferedFiles():
+    attachment = cobble.fakegateway.FakeAttachment("scores.csv", DATA)
+    with pytest.raises(TypeError):
+        asyncio.run(attachment.save(tempfile.SpooledTemporaryFile()))
+
+    buffer = io.BytesIO()
+    assert asyncio.run(attachment.save(buffer)) == len(DATA)
+    assert buffer.read() == DATA
+
+
+def testAttachedFileSave(tmp_path):
+    async def save():
+        attached = await cobble.attachments.fetch(cobble.fakegateway.FakeAttachment("scores.csv", DATA), cobble.attachments.SPOOLED)
+        try:
+            buffer = io.BytesIO()
+            written = await attached.save(buffer)
+            await attached.save(tmp_path / "scores.csv")
+            return written, buffer.read()
+        finally:
+            attached.close()
+
+    written, content = asyncio.run(save())
+    assert written == len(DATA)
+    assert content == DATA
+    assert (tmp_path / "scores.csv").read_bytes() == DATA
+
+
+def testAttachedFilePassesThroughAttachmentAttributes():
+    attachment = cobble.fakegateway.FakeAttachment("scores.csv", DATA, "text/csv")
+    attached = asyncio.run(cobble.attachments.fetch(attachment))
+    assert attached.id == attachment.id
+    assert attached.content_type == "text/csv"
+    with pytest.raises(AttributeError):
+        attached.url
+
+
+@pytest.mark.parametrize("fileType, header", [
+    ("txt", b"BMI report for the week"),
+    ("csv", b"BMW,Audi,Mercedes\n1,2,3\n"),
+    ("txt", b"GIF89a is a file format"),
+    ("md", "# Café menü, ünïcödé".encode()),
+    ("txt", "€€€€€€€€€€€".encode()[:32]), # A character cut off by the end of the header
+])
+def testTextTypesAcceptText(fileType: str, header: bytes):
+    assert cobble.attachments.matchesType(fileType, header)
+
+
+@pytest.mark.parametrize("fileType, header", [
+    ("txt", b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR"),
+    ("csv", b"\xff\xd8\xff\xe0\x00\x10JFIF"),
+    ("txt", b"\x1f\x8b\x08\x00"),
+    ("json", b'{"a": "\x00"}'),
+])
+def testTextTypesRejectBinary(fileType: str, header: bytes):
+    assert not cobble.attachments.matchesType(fileType, header)
+
+
+@pytest.mark.parametrize("fileType, header, expected", [
+    ("png", b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR", True),
+    ("png", b"\xff\xd8\xff\xe0", False),
+    ("jpeg", b"\xff\xd8\xff\xe0", True),
+    ("docx", b"PK\x03\x04\x14\x00", True),
+    ("docx", b"%PDF-1.7", False),
+    ("exe", b"MZ\x90\x00", True), # No known signature, so it can't be checked
+])
+def testSignatureTypes(fileType: str, header: bytes, expected: bool):
+    assert cobble.attachments.matchesType(fileType, header) == expected
@@ -0,0 +1,259 @@
+import cobble.bot
+import cobble.command
+import cobble.database
+import cobble.pagination
+import asyncio
+import pytest
+import types
+
+
+def run(scenario):
+    """
+    Run a scenario with a fresh in-memory SQLitePool, closing it afterwards
+    """
+    async def main():
+        pool = cobble.database.SQLitePool(":memory:", minSize=1, maxSize=2, acquireTimeout=0.2)
+        try:
+            return await scenario(pool)
+        finally:
+            await pool.close()
+    return asyncio.run(main())
+
+
+def testAcquireAndQuery():
+    async def scenario(pool):
+        async with pool.acquire() as connection:
+            return await connection.execute("SELECT ? + 1", (41,))
+
+    assert run(scenario) == [(42,)]
+
+
+def testNeverOpensMoreThanMaxSize():
+    async def scenario(pool):
+        peak = 0
+        async def use():
+            nonlocal peak
+            async with pool.acquire():
+                peak = max(peak, pool.stats()["inUse"])
+                await asyncio.sleep(0.02)
+
+        await asyncio.gather(*[use() for i in range(6)])
+        return peak, pool.stats()
+
+    peak, stats = run(scenario)
+    assert peak == 2
+    assert stats["created"] == 2
+    assert stats["acquired"] == 6
+    assert stats["inUse"] == 0
+
+
+def testAcquireTimesOut():
+    async def scenario(pool):
+        first = await pool.get()
+        second = await pool.get()
+        with pytest.raises(cobble.database.PoolTimeout):
+            await pool.get()
+        await pool.release(first)
+        await pool.release(second)
+        return pool.stats()
+
+    stats = run(scenario)
+    assert stats["timeouts"] == 1
+    assert stats["waiting"] == 0
+    assert isinstance(cobble.database.PoolTimeout(), asyncio.TimeoutError) # so commands report it as taking too long
+
+
+def testReleaseHandsConnectionToLongestWaiter():
+    async def scenario(pool):
+        held = [await pool.get(), await pool.get()]
+        order = []
+
+        async def wait(name):
+            connection = await pool.get()
+            order.append((name, connection))
+            await pool.release(connection)
+
+        waiters = [asyncio.create_task(wait("first")), asyncio.create_task(wait("second"))]
+        await asyncio.sleep(0.01)
+        assert pool.stats()["waiting"] == 2
+        await pool.release(held[0])
+        await asyncio.gather(*waiters)
+        await pool.release(held[1])
+        return held, order
+
+    held, order = run(scenario)
+    assert [name for name, connection in order] == ["first", "second"]
+    assert order[0][1] is held[0]
+
+
+def testCancelledWaiterIsSkipped():
+    async def scenario(pool):
+        held = [await pool.get(), await pool.get()]
+        waiter = asyncio.create_task(pool.get())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await pool.release(held[0])
+        await pool.release(held[1])
+        return pool.stats()
+
+    stats = run(scenario)
+    assert stats["idle"] == stats["size"] == 2
+    assert stats["waiting"] == 0
+
+
+def testWaiterCancelledAsConnectionIsHandedOverDoesNotLoseIt():
+    async def scenario(pool):
+        held = [await pool.get(), await pool.get()]
+        waiter = asyncio.create_task(pool.get())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await pool.release(held[0]) # Handed over before the waiter has seen its cancellation
+        try:
+            connection = await waiter
+        except asyncio.CancelledError: # The pool took the connection back
+            pass
+        else: # wait_for returned the connection despite the cancellation, so the caller owns it
+            await pool.release(connection)
+        await pool.release(held[1])
+        return pool.stats()
+
+    stats = run(scenario)
+    assert stats["idle"] == stats["size"] == 2
+
+
+def testReleaseRollsBackUncommittedWork():
+    async def scenario(pool):
+        async with pool.acquire() as connection:
+            await connection.execute("CREATE TABLE scores (score INTEGER)")
+            await connection.commit()
+            await connection.execute("INSERT INTO scores VALUES (1)")
+            assert connection.connection.in_transaction
+
+        async with pool.acquire() as connection:
+            assert not connection.connection.in_transaction
+            return await connection.execute("SELECT count(*) FROM scores")
+
+    assert run(scenario) == [(0,)]
+
+
+def testBrokenIdleConnectionIsReplaced():
+    async def scenario(pool):
+        pool.healthCheckInterval = 0
+        async with pool.acquire() as connection:
+            broken = connection
+        broken.connection.close()
+        await asyncio.sleep(0.01)
+
+        async with pool.acquire() as connection:
+            result = await connection.execute("SELECT 1")
+            return connection is broken, result, pool.stats()
+
+    same, result, stats = run(scenario)
+    assert not same
+    assert result == [(1,)]
+    assert stats["discarded"] == 1
+
+
+def testClosedPoolRefusesConnections():
+    async def scenario():
+        pool = cobble.database.SQLitePool(":memory:")
+        connection = await pool.get()
+        await pool.close()
+        await pool.release(connection) # Connections in use are closed as they come back
+        with pytest.raises(RuntimeError):
+            await pool.get()
+        return pool.stats()["size"]
+
+    assert asyncio.run(scenario()) == 0
+
+
+def makeBot(directory, pool):
+    configPath = directory / "config.json"
+    configPath.write_text('{"token": "test"}')
+    permissionsPath = directory / "permissions.json"
+    permissionsPath.write_text('{"permissions": {"admin": {"name": "Admin"}}, "users": {}}')
+    return cobble.bot.Bot(str(configPath), str(permissionsPath), "Test", db=pool)
+
+
+def makeMessage():
+    return types.SimpleNamespace(author=types.SimpleNamespace(id=1), attachments=[], guild=None)
+
+
+def testQueuedCommandsDoNotHoldConnections(tmp_path):
+    class Limited(cobble.command.Command):
+        def __init__(self, bot):
+            super().__init__(bot, "Limited", "limited", "Holds its connection", usesDatabase=True, concurrencyLimit=1)
+            self.peak = 0
+
+        async def execute(self, messageObject, argumentValues, attachedFiles, db):
+            self.peak = max(self.peak, self.bot.db.stats()["inUse"])
+            await asyncio.sleep(0.05)
+            return "done"
+
+    class Quick(cobble.command.Command):
+        def __init__(self, bot):
+            super().__init__(bot, "Quick", "quick", "Queries once", usesDatabase=True)
+
+        async def execute(self, messageObject, argumentValues, attachedFiles, db):
+            return str((await db.execute("SELECT 1"))[0][0])
+
+    async def scenario():
+        pool = cobble.database.SQLitePool(":memory:", maxSize=2, acquireTimeout=0.2)
+        bot = makeBot(tmp_path, pool)
+        limited = Limited(bot)
+        bot.addCommand(limited)
+        bot.addCommand(Quick(bot))
+
+        queued = [asyncio.create_task(bot.processCommand(makeMessage(), "limited")) for i in range(4)]
+        await asyncio.sleep(0.01)
+        quick = await asyncio.gather(*[bot.processCommand(makeMessage(), "quick") for i in range(3)])
+        done = await asyncio.gather(*queued)
+        stats = pool.stats()
+        await pool.close()
+        bot.executor.shutdown()
+        return limited.peak, [response for response, postCommand in quick], [response for response, postCommand in done], stats
+
+    peak, quick, done, stats = asyncio.run(scenario())
+    assert peak == 1
+    assert quick == ["1", "1", "1"]
+    assert done == ["done"] * 4
+    assert stats["timeouts"] == 0
+    assert stats["inUse"] == 0
+
+
+def testReactionsPagesCantHoldConnections(tmp_path):
+    class Pages(cobble.command.Command):
+        def __init__(self, bot):
+            super().__init__(bot, "Pages", "pages", "Pages", usesDatabase=True, pagination=cobble.pagination.REACTIONS)
+
+        async def execute(self, messageObject, argumentValues, attachedFiles, db):
+            yield "page"
+
+    class Listing(cobble.command.Command):
+        def __init__(self, bot):
+            super().__init__(bot, "Listing", "listing", "Lists rows", usesDatabase=True, pagination=cobble.pagination.REACTIONS)
+
+        async def execute(self, messageObject, argumentValues, attachedFiles, db):
+            rows = await db.execute("SELECT 1 UNION SELECT 2")
+            async def pages():
+                for row in rows:
+                    yield str(row[0])
+            return pages()
+
+    async def scenario():
+        pool = cobble.database.SQLitePool(":memory:")
+        bot = makeBot(tmp_path, pool)
+        with pytest.raises(ValueError):
+            Pages(bot)
+
+        bot.addCommand(Listing(bot))
+        response, postCommand = await bot.processCommand(makeMessage(), "listing")
+        inUse = pool.stats()["inUse"]
+        pages = await response.collect()
+        await pool.close()
+        bot.executor.shutdown()
+        return inUse, pages
+
+    assert asyncio.run(scenario()) == (0, "1\n2")
@@ -0,0 +1,136 @@
+import cobble.bot
+import cobble.permissions
+import json
+import pytest
+import types
+
+PERMISSIONS = {
+    "permissions": {"admin": {"name": "Admin"}, "mod": {"name": "Mod"}, "helper": {"name": "Helper"}, "member": {"name": "Member"}},
+    "users": {"1": ["mod"], "2": ["admin"]},
+    "roles": {"10": ["helper"]},
+    "guilds": {"20": ["member"]}
+}
+
+
+def writePermissions(directory, document=PERMISSIONS):
+    permissionsPath = directory / "permissions.json"
+    permissionsPath.write_text(json.dumps(document))
+    return str(permissionsPath)
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def backend(request, tmp_path):
+    permissionsPath = writePermissions(tmp_path)
+    if request.param == "json":
+        yield cobble.permissions.PermissionStore(permissionsPath)
+        return
+
+    sqliteBackend = cobble.permissions.migrateJSONToSQLite(permissionsPath, str(tmp_path / "permissions.db"))
+    yield sqliteBackend
+    sqliteBackend.close()
+
+
+def maskOf(backend, *permissions):
+    return backend.bits.compile(permissions)
+
+
+def testDefaultHasTheFirstBit():
+    bits = cobble.permissions.PermissionBits()
+    assert bits.bit(cobble.permissions.DEFAULT) == 1
+    assert bits.compile([]) == 1
+
+
+def testBitsAreStable():
+    bits = cobble.permissions.PermissionBits()
+    mod = bits.bit("mod")
+    helper = bits.bit("helper")
+    assert mod != helper
+    assert bits.bit("mod") == mod
+    assert bits.compile(["mod", "helper"]) == 1 | mod | helper
+
+
+def testAdminCompilesToAll():
+    bits = cobble.permissions.PermissionBits()
+    assert bits.compile(["mod", cobble.permissions.ADMIN]) == cobble.permissions.ALL
+
+
+def testUserGrants(backend):
+    assert backend.getPermissionMask("1") == maskOf(backend, "mod")
+    assert backend.getPermissionMask("3") == maskOf(backend)
+    assert backend.getPermissionMask("2") == cobble.permissions.ALL
+
+
+def testRoleAndGuildGrantsAreCombined(backend):
+    assert backend.getPermissionMask("1", ("10",)) == maskOf(backend, "mod", "helper")
+    assert backend.getPermissionMask("1", (), "20") == maskOf(backend, "mod", "member")
+    assert backend.getPermissionMask("1", ("10", "11"), "20") == maskOf(backend, "mod", "helper", "member")
+    assert backend.getPermissionMask("3", ("11",), "21") == maskOf(backend)
+
+
+def testGrantsInvalidateCachedMasks(backend):
+    assert backend.getPermissionMask("3", ("10",), "20") == maskOf(backend, "helper", "member")
+
+    backend.addUserPermission("3", "mod")
+    assert backend.getPermissionMask("3", ("10",), "20") == maskOf(backend, "mod", "helper", "member")
+
+    backend.addRolePermission("10", "admin")
+    assert backend.getPermissionMask("3", ("10",), "20") == cobble.permissions.ALL
+
+    backend.removeRolePermission("10", "admin")
+    backend.removeGuildPermission("20", "member")
+    assert backend.getPermissionMask("3", ("10",), "20") == maskOf(backend, "mod", "helper")
+
+    backend.addGuildPermission("20", "member")
+    backend.removeUserPermission("3", "mod")
+    assert backend.getPermissionMask("3", ("10",), "20") == maskOf(backend, "helper", "member")
+
+
+def testStoreNoticesFileEdits(tmp_path):
+    permissionsPath = writePermissions(tmp_path)
+    store = cobble.permissions.PermissionStore(permissionsPath)
+    assert store.getPermissionMask("1") == maskOf(store, "mod")
+
+    document = json.loads(json.dumps(PERMISSIONS))
+    document["users"]["1"] = ["mod", "helper", "member"]
+    writePermissions(tmp_path, document)
+    assert store.getPermissionMask("1") == maskOf(store, "mod", "helper", "member")
+
+
+def testSQLiteNoticesOtherConnections(tmp_path):
+    permissionsPath = writePermissions(tmp_path)
+    databasePath = str(tmp_path / "permissions.db")
+    backend = cobble.permissions.migrateJSONToSQLite(permissionsPath, databasePath)
+    other = cobble.permissions.SQLitePermissionBackend(databasePath)
+    try:
+        assert backend.getPermissionMask("1", ("10",)) == maskOf(backend, "mod", "helper")
+        other.addRolePermission("10", "member")
+        assert backend.getPermissionMask("1", ("10",)) == maskOf(backend, "mod", "helper", "member")
+    finally:
+        other.close()
+        backend.close()
+
+
+def testMigrationIsRepeatable(tmp_path):
+    permissionsPath = writePermissions(tmp_path)
+    databasePath = str(tmp_path / "permissions.db")
+    cobble.permissions.migrateJSONToSQLite(permissionsPath, databasePath).close()
+    backend = cobble.permissions.migrateJSONToSQLite(permissionsPath, databasePath)
+    try:
+        assert set(backend.getPermissionNames()) == set(PERMISSIONS["permissions"])
+        assert backend.getUserPermissions("1") == frozenset(["mod"])
+        assert backend.getGrantedPermissions("3", ("10",), "20") == {"helper", "member"}
+    finally:
+        backend.close()
+
+
+def testBotResolvesTheAuthorsRolesAndGuild(tmp_path):
+    configPath = tmp_path / "config.json"
+    configPath.write_text('{"token": "test"}')
+    bot = cobble.bot.Bot(str(configPath), writePermissions(tmp_path), "Test")
+    author = types.SimpleNamespace(id=3, roles=[types.SimpleNamespace(id=10)])
+
+    inGuild = types.SimpleNamespace(author=author, guild=types.SimpleNamespace(id=20))
+    assert bot.getPermissionMask(inGuild) == maskOf(bot.permissions, "helper", "member")
+
+    direct = types.SimpleNamespace(author=types.SimpleNamespace(id=3), guild=None)
+    assert bot.getPermissionMask(direct) == maskOf(bot.permissions)
@@ -0,0 +1,132 @@
+import cobble.singleflight
+import asyncio
+import pytest
+
+
+def testConcurrentCallsShareOneExecution():
+    async def scenario():
+        flight = cobble.singleflight.SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*[flight.run("key", work) for i in range(5)])
+        return results, len(calls), flight.inFlight
+
+    results, calls, inFlight = asyncio.run(scenario())
+    assert results == ["result"] * 5
+    assert calls == 1
+    assert inFlight == {}
+
+
+def testDifferentKeysRunSeparately():
+    async def scenario():
+        flight = cobble.singleflight.SingleFlight()
+        return await asyncio.gather(flight.run("a", lambda: asyncio.sleep(0, "a")), flight.run("b", lambda: asyncio.sleep(0, "b")))
+
+    assert asyncio.run(scenario()) == ["a", "b"]
+
+
+def testExceptionsAreShared():
+    async def scenario():
+        flight = cobble.singleflight.SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("broken")
+
+        return await asyncio.gather(*[flight.run("key", fail) for i in range(3)], return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def testFollowersRerunWhenLeaderIsCancelled():
+    async def scenario():
+        flight = cobble.singleflight.SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return len(calls)
+
+        leader = asyncio.create_task(flight.run("key", work))
+        await asyncio.sleep(0.01)
+        followers = [asyncio.create_task(flight.run("key", work)) for i in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*followers, return_exceptions=True)
+        return leader.cancelled(), results, len(calls), flight.inFlight
+
+    leaderCancelled, results, calls, inFlight = asyncio.run(scenario())
+    assert leaderCancelled
+    assert results == [2, 2, 2] # One follower ran the call again, and the others shared it
+    assert calls == 2
+    assert inFlight == {}
+
+
+def testCancelledFollowerDoesNotCancelTheCall():
+    async def scenario():
+        flight = cobble.singleflight.SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "result"
+
+        leader = asyncio.create_task(flight.run("key", work))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(flight.run("key", work))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert asyncio.run(scenario()) == "result"
+
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def testResultCacheExpiresAfterTTL():
+    clock = Clock()
+    cache = cobble.singleflight.ResultCache(10, clock=clock)
+    cache.put("key", "result")
+
+    clock.now = 9.9
+    assert cache.get("key") == (True, "result")
+
+    clock.now = 10
+    assert cache.get("key") == (False, None)
+    assert not "key" in cache.entries
+
+
+def testResultCacheRefreshesTTLOnPut():
+    clock = Clock()
+    cache = cobble.singleflight.ResultCache(10, clock=clock)
+    cache.put("key", "old")
+    clock.now = 8
+    cache.put("key", "new")
+    clock.now = 15
+    assert cache.get("key") == (True, "new")
+
+
+def testResultCacheEvictsLeastRecentlyUsed():
+    cache = cobble.singleflight.ResultCache(10, maxSize=2, clock=Clock())
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("b") == (False, None)
+    assert cache.get("c") == (True, 3)
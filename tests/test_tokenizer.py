@@ -0,0 +1,58 @@
+import cobble.benchmark
+import cobble.tokenizer
+import pytest
+import random
+
+
+CASES = [
+    "",
+    "   ",
+    "echo hello",
+    "  echo   hello  world ",
+    'echo "hello world" n=3',
+    "echo “hello world” n=3",
+    "echo ”mixed“ quotes",
+    'echo "unterminated quote',
+    'echo ""',
+    'echo a"b c"d e',
+    'n="3 4" echo',
+    '"" "" ""',
+]
+
+
+@pytest.mark.parametrize("fullString", CASES)
+def testMatchesLegacySplit(fullString: str):
+    expected = cobble.benchmark.legacySplit(fullString)
+    assert cobble.tokenizer.split(fullString) == expected
+    assert [token.text for token in cobble.tokenizer.tokenize(fullString)] == expected
+
+
+@pytest.mark.parametrize("fullString", CASES)
+def testOffsetsCoverEachElement(fullString: str):
+    for token in cobble.tokenizer.tokenize(fullString):
+        assert cobble.benchmark.legacySplit(fullString[token.start:token.end]) == [token.text]
+
+
+def testOffsetsIncludeCurlyQuotes():
+    tokens = cobble.tokenizer.tokenize("echo “hello world” n=3")
+    assert tokens == [
+        cobble.tokenizer.Token("echo", 0, 4),
+        cobble.tokenizer.Token("hello world", 5, 18),
+        cobble.tokenizer.Token("n=3", 19, 22)
+    ]
+
+
+def testRandomStrings():
+    rng = random.Random(0)
+    for i in range(5000):
+        fullString = cobble.benchmark.randomCommandString(rng.randint(0, 64), rng)
+        expected = cobble.benchmark.legacySplit(fullString)
+        assert cobble.tokenizer.split(fullString) == expected, fullString
+        tokens = cobble.tokenizer.tokenize(fullString)
+        assert [token.text for token in tokens] == expected, fullString
+        for token in tokens:
+            assert cobble.benchmark.legacySplit(fullString[token.start:token.end]) == [token.text], fullString
+
+
+def testEquivalenceCheckFindsNoMismatches():
+    assert cobble.benchmark.checkTokenizerEquivalence(samples=2000) == 0
@@ -0,0 +1,102 @@
+import collections
+import re
+
+Token = collections.namedtuple("Token", ["text", "start", "end"])
+Token.__doc__ = """
+A single element of a command string
+    text - the element, with any quotation marks removed
+    start - the index in the command string where the element begins, including any opening quotation mark
+    end - the index in the command string just past the end of the element
+"""
+
+QUOTE = re.compile('["“”]') # Phones use the curly ones sometimes
+
+
+def tokenize(fullString: str) -> list[Token]:
+    """
+    Split a command string on spaces, keeping anything inside quotation marks together as one element.
+
+    Quotation marks toggle whether spaces split, and are removed from the output. Elements left empty are dropped.
+    The string is cut into runs with str.split rather than walked one character at a time.
+    Parameters:
+        fullString - the string to split
+    Returns:
+        tokens - every element of the string, in order, with their positions in the string
+    """
+    tokens = []
+    position = 0
+    if QUOTE.search(fullString) == None:
+        for word in fullString.split(" "):
+            if word != "":
+                tokens.append(Token(word, position, position+len(word)))
+            position += len(word) + 1
+        return tokens
+
+    parts = []
+    start = None
+    # Segments alternate between outside and inside quotation marks, each one after the first following a quotation mark
+    for index, segment in enumerate(QUOTE.split(fullString)):
+        if index > 0:
+            if start == None:
+                start = position
+            position += 1
+
+        if index % 2 == 1:
+            parts.append(segment)
+            position += len(segment)
+            continue
+
+        for wordIndex, word in enumerate(segment.split(" ")):
+            if wordIndex > 0:
+                text = "".join(parts)
+                if text != "":
+                    tokens.append(Token(text, start, position))
+                parts = []
+                start = None
+                position += 1
+
+            if word != "":
+                if start == None:
+                    start = position
+                parts.append(word)
+                position += len(word)
+
+    text = "".join(parts)
+    if text != "":
+        tokens.append(Token(text, start, len(fullString)))
+
+    return tokens
+
+
+def split(fullString: str) -> list[str]:
+    """
+    Split a command string the same way as tokenize(), returning only the text of each element
+    Parameters:
+        fullString - the string to split
+    """
+    if QUOTE.search(fullString) == None:
+        return [word for word in fullString.split(" ") if word != ""]
+
+    elements = []
+    parts = []
+    for index, segment in enumerate(QUOTE.split(fullString)):
+        if index % 2 == 1:
+            parts.append(segment)
+            continue
+
+        words = segment.split(" ")
+        parts.append(words[0])
+        if len(words) == 1:
+            continue
+
+        text = "".join(parts)
+        if text != "":
+            elements.append(text)
+        elements.extend(word for word in words[1:-1] if word != "")
+        parts = [words[-1]]
+
+    text = "".join(parts)
+    if text != "":
+        elements.append(text)
+
+    return elements
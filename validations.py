@@ -1,4 +1,12 @@
 import datetime
+
+class Invalid:
+    def __repr__(self) -> str:
+        return "INVALID"
+
+INVALID = Invalid() # Returned by Validation.convert for inputs that fail validation
+
+
 class Validation:
     def __init__(self) -> None:
         """
@@ -9,6 +17,57 @@ class Validation:
     def validate(self, x):
         return True
 
+    def convert(self, x):
+        """
+        Validates an input and converts it to the type the validation describes
+        Parameters:
+            x - the input to convert
+        Returns:
+            value - the converted input, or INVALID if the input is not valid
+        """
+        if self.validate(x):
+            return x
+        return INVALID
+
+
+
+class Chain(Validation):
+    def __init__(self, *validations: Validation) -> None:
+        """
+        Apply several validations in order, each one receiving the value converted by the one before,
+        i.e. Chain(IsNumber(), IsPositive()) parses the input once and then checks the resulting number
+        Parameters:
+            validations - the validations to apply
+        """
+        super().__init__()
+        self.validations = validations
+        requirements = [validation.requirements for validation in validations if validation.requirements != ""]
+        self.requirements = " and ".join(requirements[:1] + [requirement[:1].lower() + requirement[1:] for requirement in requirements[1:]])
+
+    def validate(self, x) -> bool:
+        """
+        Determines whether a given input passes every validation in the chain
+        Parameters:
+            x - the input to test
+        Returns:
+            valid - True if the input passes every validation, False otherwise
+        """
+        return self.convert(x) is not INVALID
+
+    def convert(self, x):
+        """
+        Passes an input through every validation in the chain
+        Parameters:
+            x - the input to convert
+        Returns:
+            value - the input as converted by the last validation, or INVALID if any validation fails
+        """
+        for validation in self.validations:
+            x = validation.convert(x)
+            if x is INVALID:
+                return INVALID
+        return x
+
 
 
 class IsString(Validation):
@@ -18,7 +77,7 @@ class IsString(Validation):
         """
         super().__init__()
         self.requirements = "Must be a parseable string"
-    
+
 
     def validate(self, x: str) -> bool:
         """
@@ -28,23 +87,53 @@ class IsString(Validation):
         Returns:
             valid - True if the input is a valid string, False otherwise
         """
+        return self.convert(x) is not INVALID
+
+    def convert(self, x) -> str:
+        """
+        Converts an input to a string
+        Parameters:
+            x - the input to convert
+        Returns:
+            value - the input as a string, or INVALID if it can't be converted
+        """
         try:
-            str(x)
+            return str(x)
         except:
-            return False
-        else:
-            return True
-        
+            return INVALID
+
 
 class IsCommand(Validation):
-    def __init__(self, commandList) -> None:
+    def __init__(self, commandIndex: dict | list) -> None:
         """
         Validate that an input is in the list of commands
+        Parameters:
+            commandIndex - the bot's trigger index, mapping every trigger and alias to its command, or a list of commands
+                           such as bot.commands. Both are read as they change, but the index is checked without rebuilding anything
         """
         super().__init__()
         self.requirements = "Must be in the command list"
-        self.commandList = commandList
-    
+        self.commandIndex = commandIndex
+        self.listedTriggers = None # the triggers of a list of commands, rebuilt when commands are added to it
+        self.listedCount = None
+
+
+    def getTriggers(self):
+        if isinstance(self.commandIndex, dict):
+            return self.commandIndex
+
+        if self.listedCount != len(self.commandIndex):
+            triggers = set()
+            for command in self.commandIndex:
+                if type(command.trigger) == list:
+                    triggers.update(command.trigger)
+                else:
+                    triggers.add(command.trigger)
+            self.listedTriggers = triggers
+            self.listedCount = len(self.commandIndex)
+
+        return self.listedTriggers
+
 
     def validate(self, x: str) -> bool:
         """
@@ -54,15 +143,7 @@ class IsCommand(Validation):
         Returns:
             valid - True if the input is a valid string, False otherwise
         """
-        allCommands = []
-        for command in self.commandList:
-            if type(command.trigger) == list:
-                for alias in command.trigger:
-                    allCommands.append(alias)
-            else:
-                allCommands.append(command.trigger)
-
-        return (x in allCommands)
+        return (x in self.getTriggers())
 
 
 class IsInteger(Validation):
@@ -79,14 +160,29 @@ class IsInteger(Validation):
         Returns:
             valid - True if the input is a valid integer, False otherwise
         """
+        return self.convert(x) is not INVALID
+
+    def convert(self, x) -> int:
+        """
+        Converts an input to an integer
+        Parameters:
+            x - the input to convert. Numbers that have already been parsed are accepted if they are whole
+        Returns:
+            value - the input as an int, or INVALID if it isn't a valid integer
+        """
+        if type(x) == int:
+            return x
+
+        if type(x) == float:
+            if x.is_integer():
+                return int(x)
+            return INVALID
+
         try:
-            inted = int(x)
+            return int(x)
         except:
-            return False
-        else:
-            floated = float(x)
-            return float(inted) == floated
-        
+            return INVALID
+
 
 
 class IsISO8601(Validation):
@@ -104,15 +200,26 @@ class IsISO8601(Validation):
         Returns:
             valid - True if the input is a valid date string, False otherwise
         """
+        return self.convert(x) is not INVALID
+
+    def convert(self, x) -> datetime.date:
+        """
+        Converts an ISO8601 date string to a date
+        Parameters:
+            x - the input to convert
+        Returns:
+            value - the input as a datetime.date, or INVALID if it isn't a valid date string
+        """
+        if type(x) == datetime.date:
+            return x
+
         dateFormat = "%Y-%m-%d"
 
         try:
-            datetime.datetime.strptime(x, dateFormat)
+            return datetime.datetime.strptime(x, dateFormat).date()
         except:
-            return False
-        else:
-            return True
-        
+            return INVALID
+
 class IsNumber(Validation):
     def __init__(self) -> None:
         """
@@ -128,13 +235,23 @@ class IsNumber(Validation):
         Returns:
             valid - True if the input is a valid number, False otherwise
         """
+        return self.convert(x) is not INVALID
+
+    def convert(self, x) -> float:
+        """
+        Converts an input to a number
+        Parameters:
+            x - the input to convert
+        Returns:
+            value - the input as a float, or INVALID if it isn't a valid number
+        """
+        if type(x) in (int, float):
+            return x
 
         try:
-            numericalValue = float(x)
+            return float(x)
         except:
-            return False
-        else:
-            return True
+            return INVALID
 
 class IsPositive(Validation):
     def __init__(self) -> None:
@@ -145,37 +262,66 @@ class IsPositive(Validation):
 
     def validate(self, x: str) -> bool:
         """
-        Determines whether a given input is a valid ISO8601 date string
+        Determines whether a given input is a positive number
         Parameters:
             x - the input to test
         Returns:
-            valid - True if the input is a valid date string, False otherwise
+            valid - True if the input is a positive number, False otherwise
         """
+        return self.convert(x) is not INVALID
 
-        try:
-            numericalValue = float(x)
-        except:
-            return False
+    def convert(self, x) -> float:
+        """
+        Converts an input to a number, requiring it to be positive
+        Parameters:
+            x - the input to convert. Numbers that have already been parsed are checked without being converted again
+        Returns:
+            value - the number, or INVALID if it isn't a positive number
+        """
+        if type(x) in (int, float):
+            numericalValue = x
         else:
-            return (numericalValue >= 0)
-        
+            try:
+                numericalValue = float(x)
+            except:
+                return INVALID
+
+        if numericalValue >= 0:
+            return numericalValue
+        return INVALID
+
 
 
 class IsBool(Validation):
     def __init__(self) -> None:
         """
-        Validate that an input is a valid ISO8601 datestring
+        Validate that an input is a boolean
         """
         self.requirements = "Must be either true or false"
 
     def validate(self, x: str) -> bool:
         """
-        Determines whether a given input is a valid ISO8601 date string
+        Determines whether a given input is a valid boolean
         Parameters:
             x - the input to test
         Returns:
             valid - True if the input is a valid bool, False otherwise
         """
-        if x in ["true", "false"]:
+        return self.convert(x) is not INVALID
+
+    def convert(self, x) -> bool:
+        """
+        Converts "true" or "false" to a bool
+        Parameters:
+            x - the input to convert
+        Returns:
+            value - the input as a bool, or INVALID if it is neither
+        """
+        if type(x) == bool:
+            return x
+
+        if x == "true":
             return True
-        return False
\ No newline at end of file
+        if x == "false":
+            return False
+        return INVALID
\ No newline at end of file